@@ -12,21 +12,45 @@ except Exception:
     _PIL_AVAILABLE = False
 
 
+# Lazily-initialized default font; ImageFont.load_default() is not free,
+# so do it once per process instead of per placeholder render.
+_DEFAULT_FONT = None
+
+def _get_font():
+    global _DEFAULT_FONT
+    if _DEFAULT_FONT is None and _PIL_AVAILABLE:
+        try:
+            _DEFAULT_FONT = ImageFont.load_default()  # type: ignore
+        except Exception:
+            _DEFAULT_FONT = None
+    return _DEFAULT_FONT
+
+
 # --- Minimal PNG writer (solid color) ---
 # Writes a valid PNG with a single IDAT chunk containing zlib-compressed raw RGB scanlines.
-def write_solid_png(path: str, w: int, h: int, rgb: tuple):
-    import struct, zlib, binascii
+# Deflated IDAT payloads are memoized; repeated calls for the same canvas
+# (the common default placeholder) become a plain file write.
+_IDAT_CACHE: dict = {}
 
-    r, g, b = rgb
-    # Each scanline: filter byte (0) + RGB bytes
-    raw = bytearray()
-    row = bytes([0] + [r, g, b] * w)
-    for _ in range(h):
-        raw.extend(row)
-    compressed = zlib.compress(bytes(raw), level=6)
+def write_solid_png(path: str, w: int, h: int, rgb: tuple):
+    import struct, zlib
+
+    compressed = _IDAT_CACHE.get((w, h, rgb))
+    if compressed is None:
+        r, g, b = rgb
+        # Each scanline: filter byte (0) + RGB bytes. bytes.__mul__ builds the
+        # whole image in C instead of an h-iteration Python loop.
+        row = bytes([0] + [r, g, b] * w)
+        raw = row * h
+        # Placeholders are written once and discarded; favor encode speed over size.
+        compressed = zlib.compress(raw, level=1)
+        _IDAT_CACHE[(w, h, rgb)] = compressed
 
     def chunk(tag: bytes, data: bytes) -> bytes:
-        return struct.pack("!I", len(data)) + tag + data + struct.pack("!I", binascii.crc32(tag + data) & 0xffffffff)
+        # Running-seed CRC avoids concatenating tag + data (an extra copy of
+        # the whole IDAT payload) just to checksum it.
+        crc = zlib.crc32(data, zlib.crc32(tag))
+        return struct.pack("!I", len(data)) + tag + data + struct.pack("!I", crc & 0xffffffff)
 
     sig = b"\x89PNG\r\n\x1a\n"
     ihdr = struct.pack("!IIBBBBB", w, h, 8, 2, 0, 0, 0)  # 8-bit, RGB
@@ -61,11 +85,16 @@ def run_sd_lora(prompt: str, out: str, init_image_path: str = '') -> str:
         raise RuntimeError(f'Stable Diffusion initialization failed: {ex}. Check your environment configuration.') from ex
 
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    if device == 'cuda':
+        # bf16 avoids fp16 overflow and matches fp16 throughput on Ampere+ (SM 8.x)
+        dtype = torch.bfloat16 if torch.cuda.get_device_capability()[0] >= 8 else torch.float16
+    else:
+        dtype = torch.float32
 
     if init_image_path and os.path.exists(init_image_path):
-        pipe = StableDiffusionImg2ImgPipeline.from_pretrained(base_model, torch_dtype=torch.float16 if device=='cuda' else torch.float32)
+        pipe = StableDiffusionImg2ImgPipeline.from_pretrained(base_model, torch_dtype=dtype)
     else:
-        pipe = StableDiffusionPipeline.from_pretrained(base_model, torch_dtype=torch.float16 if device=='cuda' else torch.float32)
+        pipe = StableDiffusionPipeline.from_pretrained(base_model, torch_dtype=dtype)
     pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(pipe.scheduler.config)
 
     if lora_path:
@@ -77,12 +106,17 @@ def run_sd_lora(prompt: str, out: str, init_image_path: str = '') -> str:
         except Exception as ex:
             raise RuntimeError(f'Failed to load LoRA weights from {lora_path}: {ex}')
 
-    if device == 'cuda':
-        pipe = pipe.to('cuda')
-        pipe.enable_attention_slicing()
-    else:
-        pipe = pipe.to('cpu')
-        pipe.enable_attention_slicing()
+    pipe = pipe.to(device)
+    # Memory-efficient attention (xformers if installed, else PyTorch 2 SDPA)
+    # instead of attention slicing, which serializes attention for memory.
+    try:
+        pipe.enable_xformers_memory_efficient_attention()
+    except Exception:
+        try:
+            from diffusers.models.attention_processor import AttnProcessor2_0  # type: ignore
+            pipe.unet.set_attn_processor(AttnProcessor2_0())
+        except Exception:
+            pass
 
     generator = torch.Generator(device=device)
     if seed is not None:
@@ -92,17 +126,24 @@ def run_sd_lora(prompt: str, out: str, init_image_path: str = '') -> str:
     width = int(os.environ.get('GHIBLI_SD_WIDTH', '768'))
     height = int(os.environ.get('GHIBLI_SD_HEIGHT', '512'))
 
-    if init_image_path and os.path.exists(init_image_path):
-        if not _PIL_AVAILABLE:
-            raise RuntimeError('Pillow required for img2img init image. Install requirements.txt')
-        init_img = Image.open(init_image_path).convert('RGB')  # type: ignore
-        strength = float(os.environ.get('GHIBLI_SD_STRENGTH', '0.65'))
-        out_img = pipe(prompt=prompt, image=init_img, num_inference_steps=steps, guidance_scale=guidance, generator=generator, strength=strength).images[0]
-    else:
-        out_img = pipe(prompt=prompt, width=width, height=height, num_inference_steps=steps, guidance_scale=guidance, generator=generator).images[0]
+    # Denoise to latents and decode through the VAE in one batched pass;
+    # inference_mode also skips the autograd view tracking no_grad keeps.
+    with torch.inference_mode():
+        if init_image_path and os.path.exists(init_image_path):
+            if not _PIL_AVAILABLE:
+                raise RuntimeError('Pillow required for img2img init image. Install requirements.txt')
+            init_img = Image.open(init_image_path).convert('RGB')  # type: ignore
+            strength = float(os.environ.get('GHIBLI_SD_STRENGTH', '0.65'))
+            latents = pipe(prompt=prompt, image=init_img, num_inference_steps=steps, guidance_scale=guidance, generator=generator, strength=strength, output_type='latent').images
+        else:
+            latents = pipe(prompt=prompt, width=width, height=height, num_inference_steps=steps, guidance_scale=guidance, generator=generator, output_type='latent').images
+        images = pipe.vae.decode(latents / pipe.vae.config.scaling_factor).sample
+        images = (images / 2 + 0.5).clamp(0, 1)
+    out_img = pipe.numpy_to_pil(images.cpu().permute(0, 2, 3, 1).float().numpy())[0]
 
     out_path = out if out.lower().endswith('.png') else (out + '.png')
-    out_img.save(out_path)
+    # Written once and consumed immediately; favor encode speed over size
+    out_img.save(out_path, format='PNG', compress_level=1, optimize=False)
     return out_path
 
 
@@ -125,6 +166,11 @@ def main():
         'model': args.model,
     }
 
+    # Normalize the output path and probe the input image once instead of
+    # re-deriving them in every branch below
+    out_path = args.out if args.out.lower().endswith('.png') else (args.out + '.png')
+    has_input = bool(args.input_image) and os.path.exists(args.input_image)
+
     try:
         # Stable Diffusion + LoRA path (text-to-image, optional img2img when input provided)
         if args.model == 'sd-lora':
@@ -133,13 +179,12 @@ def main():
             return
 
         # If an input image is provided, we require Pillow
-        if args.input_image and os.path.exists(args.input_image):
+        if has_input:
             if not _PIL_AVAILABLE:
                 raise RuntimeError('Pillow (PIL) not installed; required to process uploaded images. Install requirements.txt')
             # If AnimeGAN command provided, use it to stylize the uploaded image
             if args.animegan_cmd:
                 # The command may contain placeholders {in} and {out}
-                out_path = args.out if args.out.lower().endswith('.png') else (args.out + '.png')
                 cmd = args.animegan_cmd.replace('{in}', args.input_image).replace('{out}', out_path)
                 import subprocess
                 p = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -155,14 +200,11 @@ def main():
             # Else, simple PIL placeholder stylization
             img = Image.open(args.input_image).convert('RGB')  # type: ignore
             img = img.filter(ImageFilter.SMOOTH_MORE).filter(ImageFilter.EDGE_ENHANCE)  # type: ignore
-            out_path = args.out if args.out.lower().endswith('.png') else (args.out + '.png')
-            img.save(out_path, format='PNG')  # type: ignore
+            img.save(out_path, format='PNG', compress_level=1, optimize=False)  # type: ignore
             print(json.dumps({'ok': True, 'outputPath': out_path, 'meta': meta}))
             return
 
         # No input image: produce a PNG file
-        out_path = args.out if args.out.lower().endswith('.png') else (args.out + '.png')
-        
         # For sd-lora model, we should have already handled it above
         if args.model == 'sd-lora':
             raise RuntimeError('sd-lora model should have been handled above. This indicates a fallback to placeholder generation.')
@@ -172,13 +214,8 @@ def main():
             img = Image.new('RGB', (768, 512), color=(220, 230, 240))  # type: ignore
             draw = ImageDraw.Draw(img)  # type: ignore
             caption = (args.prompt or 'Ghibli style scene')[:160]
-            try:
-                font = ImageFont.load_default()  # type: ignore
-            except Exception:
-                font = None
-            draw.text((24, 24), f"Model: {args.model}", fill=(20, 60, 90), font=font)  # type: ignore
-            draw.text((24, 56), f"Prompt: {caption}", fill=(20, 60, 90), font=font)  # type: ignore
-            img.save(out_path, format='PNG')  # type: ignore
+            draw.multiline_text((24, 24), f"Model: {args.model}\nPrompt: {caption}", fill=(20, 60, 90), font=_get_font(), spacing=8)  # type: ignore
+            img.save(out_path, format='PNG', compress_level=1, optimize=False)  # type: ignore
         else:
             # Fallback: write a solid-color PNG without external libs
             write_solid_png(out_path, 768, 512, (220, 230, 240))
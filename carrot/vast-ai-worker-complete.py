@@ -6,15 +6,78 @@ This is the complete worker file you need to run on your Vast.ai instance
 
 import os
 import shutil
-import subprocess
 import tempfile
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.responses import JSONResponse, FileResponse
 import uvicorn
 import json
 
-app = FastAPI(title="Ghibli AI Worker", version="1.0.0")
+try:
+    # orjson (Rust) serializes the big base64-image payloads several times
+    # faster than stdlib json; fall back silently when it isn't installed
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultJSONResponse
+
+app = FastAPI(title="Ghibli AI Worker", version="1.0.0", default_response_class=DefaultJSONResponse)
+
+# Optional: io_uring-backed batch unlink. With many temp files the cleanup is
+# pure syscall overhead; queueing IORING_OP_UNLINKAT in batches submits ~128
+# removals per kernel round trip (needs the liburing bindings + kernel 5.11+).
+try:
+    import liburing  # type: ignore
+    _IOURING_AVAILABLE = hasattr(liburing, 'io_uring_prep_unlinkat')
+except ImportError:
+    liburing = None  # type: ignore
+    _IOURING_AVAILABLE = False
+
+_UNLINK_BATCH = 128
+
+def batch_unlink(paths):
+    """Unlink paths, via io_uring batches when available. Returns (removed_paths, errors)."""
+    removed, errors = [], []
+    pending = list(paths)
+    if _IOURING_AVAILABLE and paths:
+        try:
+            ring = liburing.io_uring()
+            liburing.io_uring_queue_init(min(256, max(len(paths), 1)), ring, 0)
+            try:
+                for start in range(0, len(paths), _UNLINK_BATCH):
+                    batch = paths[start:start + _UNLINK_BATCH]
+                    for i, path in enumerate(batch):
+                        sqe = liburing.io_uring_get_sqe(ring)
+                        liburing.io_uring_prep_unlinkat(sqe, os.fsencode(path))
+                        # completions arrive in any order; user_data maps
+                        # each CQE back to its path
+                        sqe.user_data = start + i
+                    liburing.io_uring_submit_and_wait(ring, len(batch))
+                    cqe = liburing.io_uring_cqe()
+                    for _ in batch:
+                        liburing.io_uring_wait_cqe(ring, cqe)
+                        path = paths[cqe.user_data]
+                        if cqe.res < 0:
+                            errors.append(f"Failed to clean {path}: errno {-cqe.res}")
+                        else:
+                            removed.append(path)
+                        liburing.io_uring_cqe_seen(ring, cqe)
+                return removed, errors
+            finally:
+                liburing.io_uring_queue_exit(ring)
+        except Exception:
+            # fall through to the plain unlink loop, keeping what the ring
+            # already removed so those aren't re-unlinked as phantom errors
+            errors = []
+            done = set(removed)
+            pending = [p for p in paths if p not in done]
+    for path in pending:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except Exception as e:
+            errors.append(f"Failed to clean {path}: {str(e)}")
+    return removed, errors
 
 def cleanup_disk_space():
     """Clean up disk space on the Vast.ai worker"""
@@ -26,62 +89,79 @@ def cleanup_disk_space():
     
     try:
         # 1. Clean temporary files
+        # scandir's DirEntry caches type/size info, so each entry costs one
+        # stat instead of the three from isfile/isdir/getsize
         temp_dirs = ['/tmp', '/var/tmp']
+        file_sizes = {}
         for temp_dir in temp_dirs:
             if os.path.exists(temp_dir):
-                for item in os.listdir(temp_dir):
-                    item_path = os.path.join(temp_dir, item)
-                    try:
-                        if os.path.isfile(item_path):
-                            size = os.path.getsize(item_path)
-                            os.remove(item_path)
-                            cleanup_results["cleaned_files"] += 1
-                            cleanup_results["freed_space_mb"] += size / (1024 * 1024)
-                        elif os.path.isdir(item_path) and item.startswith(('ghibli-', 'generated_', 'tmp_')):
-                            size = get_dir_size(item_path)
-                            shutil.rmtree(item_path)
-                            cleanup_results["cleaned_files"] += 1
-                            cleanup_results["freed_space_mb"] += size / (1024 * 1024)
-                    except Exception as e:
-                        cleanup_results["errors"].append(f"Failed to clean {item_path}: {str(e)}")
+                with os.scandir(temp_dir) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_file(follow_symlinks=False):
+                                file_sizes[entry.path] = entry.stat(follow_symlinks=False).st_size
+                            elif entry.is_dir(follow_symlinks=False) and entry.name.startswith(('ghibli-', 'generated_', 'tmp_')):
+                                size = get_dir_size(entry.path)
+                                shutil.rmtree(entry.path)
+                                cleanup_results["cleaned_files"] += 1
+                                cleanup_results["freed_space_mb"] += size / (1024 * 1024)
+                        except Exception as e:
+                            cleanup_results["errors"].append(f"Failed to clean {entry.path}: {str(e)}")
+        removed, errors = batch_unlink(list(file_sizes))
+        cleanup_results["cleaned_files"] += len(removed)
+        cleanup_results["freed_space_mb"] += sum(file_sizes[p] for p in removed) / (1024 * 1024)
+        cleanup_results["errors"].extend(errors)
         
-        # 2. Clean Python cache
+        # 2. Clean Python cache (in-process walk; no find/rm fork+exec per dir)
         try:
-            result = subprocess.run(['find', '.', '-name', '__pycache__', '-type', 'd', '-exec', 'rm', '-rf', '{}', '+'], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                cleanup_results["cleaned_files"] += 1
+            for root, dirs, _ in os.walk('.', topdown=False):
+                for d in dirs:
+                    if d == '__pycache__':
+                        shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+                        cleanup_results["cleaned_files"] += 1
         except Exception as e:
             cleanup_results["errors"].append(f"Failed to clean Python cache: {str(e)}")
-        
-        # 3. Clean pip cache
+
+        # 3. Clean pip cache in-process (same dirs `pip cache purge` clears,
+        # without spawning a pip process)
         try:
-            result = subprocess.run(['pip', 'cache', 'purge'], capture_output=True, text=True)
-            if result.returncode == 0:
-                cleanup_results["cleaned_files"] += 1
+            pip_cache = os.environ.get('PIP_CACHE_DIR', os.path.expanduser('~/.cache/pip'))
+            for sub in ('wheels', 'http', 'http-v2'):
+                cache_dir = os.path.join(pip_cache, sub)
+                if os.path.isdir(cache_dir):
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                    cleanup_results["cleaned_files"] += 1
         except Exception as e:
             cleanup_results["errors"].append(f"Failed to clean pip cache: {str(e)}")
         
         # 4. Clean old generated images (keep only last 10)
-        output_dir = Path('./outputs')
-        if output_dir.exists():
-            image_files = list(output_dir.glob('*.png')) + list(output_dir.glob('*.jpg'))
+        # One scandir pass matches both suffixes; DirEntry.stat() is cached,
+        # so the mtime sort and size reads don't re-stat
+        output_dir = './outputs'
+        if os.path.isdir(output_dir):
+            with os.scandir(output_dir) as entries:
+                image_files = [e for e in entries
+                               if e.is_file() and e.name.endswith(('.png', '.jpg'))]
             if len(image_files) > 10:
                 # Sort by modification time, keep newest 10
-                image_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
+                image_files.sort(key=lambda e: e.stat().st_mtime, reverse=True)
                 for old_file in image_files[10:]:
                     try:
                         size = old_file.stat().st_size
-                        old_file.unlink()
+                        os.unlink(old_file.path)
                         cleanup_results["cleaned_files"] += 1
                         cleanup_results["freed_space_mb"] += size / (1024 * 1024)
                     except Exception as e:
-                        cleanup_results["errors"].append(f"Failed to clean {old_file}: {str(e)}")
+                        cleanup_results["errors"].append(f"Failed to clean {old_file.path}: {str(e)}")
         
-        # 5. Get current disk usage
+        # 5. Get current disk usage (one statvfs syscall; no df fork + parse)
         try:
-            result = subprocess.run(['df', '-h', '/'], capture_output=True, text=True)
-            cleanup_results["disk_usage"] = result.stdout.strip()
+            s = os.statvfs('/')
+            cleanup_results["disk_usage"] = {
+                "total_gb": s.f_blocks * s.f_frsize / 2**30,
+                "free_gb": s.f_bavail * s.f_frsize / 2**30,
+                "used_pct": 100 * (1 - s.f_bavail / s.f_blocks),
+            }
         except Exception as e:
             cleanup_results["errors"].append(f"Failed to get disk usage: {str(e)}")
             
@@ -90,19 +170,40 @@ def cleanup_disk_space():
     
     return cleanup_results
 
-def get_dir_size(path):
-    """Get directory size in bytes"""
-    total = 0
+def _scan_one_dir(path):
+    """Scan a single directory; returns (bytes_in_dir, subdir_paths)"""
+    size = 0
+    subdirs = []
     try:
-        for dirpath, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                filepath = os.path.join(dirpath, filename)
+        with os.scandir(path) as entries:
+            for entry in entries:
                 try:
-                    total += os.path.getsize(filepath)
+                    if entry.is_file(follow_symlinks=False):
+                        size += entry.stat(follow_symlinks=False).st_size
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
                 except (OSError, FileNotFoundError):
                     pass
     except Exception:
         pass
+    return size, subdirs
+
+def get_dir_size(path):
+    """Get directory size in bytes.
+
+    Level-synchronous BFS with a small thread pool: the work is purely stat
+    syscalls, which the kernel services in parallel, so sibling directories
+    are scanned concurrently instead of one at a time.
+    """
+    total = 0
+    pending = [path]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        while pending:
+            next_level = []
+            for size, subdirs in pool.map(_scan_one_dir, pending):
+                total += size
+                next_level.extend(subdirs)
+            pending = next_level
     return total
 
 @app.get("/health")
@@ -1,6 +1,12 @@
-import base64, io, os
+import io, os
+import threading
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 from typing import Optional
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
 from pydantic import BaseModel
 from PIL import Image
 import numpy as np
@@ -16,6 +22,11 @@ app = FastAPI(title="Enhancer API")
 # ---- Lazy globals ----
 _g_esr_cache = {}
 _g_codeformer = None
+_g_helper = None
+# /enhance is a sync endpoint, so FastAPI runs it concurrently on the
+# threadpool — the helper's detection/landmark state is per-image and must
+# not be shared mid-flight
+_g_helper_lock = threading.Lock()
 
 def load_codeformer():
     if not CODEFORMER_AVAILABLE:
@@ -45,8 +56,21 @@ class EnhanceReq(BaseModel):
     codeformer_weight: float = 0.6
     upscale: int = 0  # 0, 2, or 4
 
+# Reject oversized/bogus payloads before paying for the decode; PIL's pixel
+# cap stops decompression bombs behind a small compressed body
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+Image.MAX_IMAGE_PIXELS = 64 * 1024 * 1024
+
 def b64_to_image(b64: str) -> Image.Image:
-    raw = base64.b64decode(b64)
+    if (len(b64) * 3) >> 2 > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="image too large")
+    # validate=True: pybase64 does validation + decode in one SIMD pass.
+    # binascii.Error (a ValueError) covers junk the lenient default decode
+    # used to silently strip — surface it as a client error, not a 500.
+    try:
+        raw = base64.b64decode(b64, validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid base64 image data")
     return Image.open(io.BytesIO(raw)).convert("RGB")
 
 def image_to_b64(img: Image.Image, fmt="PNG") -> str:
@@ -60,23 +84,31 @@ def restore_faces(image: Image.Image, weight: float = 0.6) -> Image.Image:
         return image
     
     model = load_codeformer()
-    helper = FaceRestoreHelper(
-        upscale_factor=1, device='cuda', det_model='retinaface_resnet50'
-    )
-    helper.read_image(np.array(image))
-    helper.get_face_landmarks_5()
-    helper.align_warp_face()
-
-    # If no faces detected, return original
-    if not helper.cropped_faces:
-        return image
-
-    with torch.no_grad():
-        for cropped in helper.cropped_faces:
-            restored = model(cropped.cuda(), w=weight, adain=False)[0]
-            helper.add_restored_face(restored)
-
-    final = helper.get_final_image()
+    # Reuse one helper across calls: constructing it reloads RetinaFace into
+    # VRAM and reallocates working buffers every request. The lock covers the
+    # whole detect/restore/paste sequence since the helper is stateful.
+    global _g_helper
+    with _g_helper_lock:
+        if _g_helper is None:
+            _g_helper = FaceRestoreHelper(
+                upscale_factor=1, device='cuda', det_model='retinaface_resnet50'
+            )
+        helper = _g_helper
+        helper.clean_all()
+        helper.read_image(np.array(image))
+        helper.get_face_landmarks_5()
+        helper.align_warp_face()
+
+        # If no faces detected, return original
+        if not helper.cropped_faces:
+            return image
+
+        with torch.no_grad():
+            for cropped in helper.cropped_faces:
+                restored = model(cropped.cuda(), w=weight, adain=False)[0]
+                helper.add_restored_face(restored)
+
+        final = helper.get_final_image()
     return Image.fromarray(final)
 
 def upscale_image(image: Image.Image, scale: int) -> Image.Image:
@@ -89,6 +121,11 @@ def upscale_image(image: Image.Image, scale: int) -> Image.Image:
 
 @app.post("/enhance")
 def enhance(req: EnhanceReq):
+    # No-op request: hand the input back without paying two base64 passes
+    # plus a PIL decode/re-encode
+    if not req.face_restore and req.upscale not in (2, 4):
+        return {"enhanced_base64": req.image_base64}
+
     img = b64_to_image(req.image_base64)
 
     if req.face_restore:
@@ -98,3 +135,34 @@ def enhance(req: EnhanceReq):
         img = upscale_image(img, req.upscale)
 
     return {"enhanced_base64": image_to_b64(img)}
+
+@app.post("/enhance_raw")
+async def enhance_raw(request: Request):
+    """Raw-bytes variant of /enhance.
+
+    Takes the JPEG/PNG body as-is and returns PNG bytes, skipping the two
+    base64 passes and the multi-MB JSON parse the b64 endpoint pays on both
+    sides. Options ride in headers.
+    """
+    raw = await request.body()
+
+    # No-op request: return the payload untouched
+    do_face = request.headers.get("X-Face-Restore", "1") == "1"
+    upscale = int(request.headers.get("X-Upscale", "0"))
+    if not do_face and upscale not in (2, 4):
+        return Response(
+            content=raw,
+            media_type=request.headers.get("content-type", "application/octet-stream"),
+        )
+
+    img = Image.open(io.BytesIO(raw)).convert("RGB")
+
+    if do_face:
+        img = restore_faces(img, float(request.headers.get("X-Weight", "0.6")))
+
+    if upscale in (2, 4):
+        img = upscale_image(img, upscale)
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1, optimize=False)
+    return Response(content=buf.getvalue(), media_type="image/png")
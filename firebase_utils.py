@@ -1,24 +1,36 @@
 # firebase_utils.py
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, storage
+from requests.adapters import HTTPAdapter
 
 _initialized = False
+_bucket = None
 
 def init_firebase():
-    global _initialized
+    global _initialized, _bucket
     if _initialized:
         return
     cred_path = os.environ.get("FIREBASE_CREDENTIALS", "")
     bucket_name = os.environ.get("FIREBASE_BUCKET", "")
-    
+
     if not cred_path or not bucket_name:
         print("Warning: Firebase credentials not configured")
         return
-    
+
     cred = credentials.Certificate(cred_path)
     firebase_admin.initialize_app(cred, {"storageBucket": bucket_name})
+    # Cache the bucket handle and widen the underlying session's connection
+    # pool so bursty uploads reuse keep-alive TLS connections instead of
+    # paying a handshake + auth exchange per call
+    _bucket = storage.bucket()
+    try:
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+        _bucket.client._http.mount("https://", adapter)
+    except Exception as e:
+        print(f"Warning: could not configure HTTP pooling: {e}")
     _initialized = True
 
 def save_png_bytes_and_get_url(png_bytes: bytes, filename_prefix: str = "sdxl"):
@@ -26,10 +38,11 @@ def save_png_bytes_and_get_url(png_bytes: bytes, filename_prefix: str = "sdxl"):
         init_firebase()
         if not _initialized:
             return None
-        
-        bucket = storage.bucket()
+
         ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")
-        blob = bucket.blob(f"images/{filename_prefix}_{ts}.png")
+        blob = _bucket.blob(f"images/{filename_prefix}_{ts}.png")
+        # chunk_size stays unset so small payloads go up as one multipart PUT
+        # instead of a resumable-session handshake + upload round trip
         blob.upload_from_string(png_bytes, content_type="image/png")
         # Make public (or use signed URL depending on your policy)
         blob.make_public()
@@ -37,3 +50,11 @@ def save_png_bytes_and_get_url(png_bytes: bytes, filename_prefix: str = "sdxl"):
     except Exception as e:
         print(f"Error saving to Firebase: {e}")
         return None
+
+# Uploads are pure network wait; pushing them onto this pool lets callers
+# overlap the GCS round trip with base64 encoding and response building
+_upload_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="firebase-upload")
+
+def submit_png_upload(png_bytes: bytes, filename_prefix: str = "sdxl"):
+    """Start the upload in the background; call .result() when the URL is needed."""
+    return _upload_pool.submit(save_png_bytes_and_get_url, png_bytes, filename_prefix)
@@ -1,65 +1,135 @@
 # generator_api.py
-import os, io, base64
+import asyncio
+import os, io
+from queue import Empty, SimpleQueue
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 from typing import Optional, Dict, Any
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from PIL import Image
-import requests
+import numpy as np
+import httpx
+
+# Lazy CUDA module loading: faster import, less VRAM held by unused kernels
+os.environ.setdefault("CUDA_MODULE_LOADING", "LAZY")
 import torch
+
+# TF32 matmul/conv on Ampere+ (~2x fp32 throughput, negligible quality delta)
+# and cudnn autotune for the fixed SDXL shapes
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
+torch.backends.cudnn.benchmark = True
+torch.set_float32_matmul_precision("high")
 from dotenv import load_dotenv
 
-from diffusers import StableDiffusionXLPipeline, StableDiffusionXLImg2ImgPipeline
+from diffusers import (
+    StableDiffusionXLPipeline,
+    StableDiffusionXLImg2ImgPipeline,
+    DPMSolverMultistepScheduler,
+)
+from diffusers.models.attention_processor import AttnProcessor2_0
 from prompt_builder import build_prompts, style_params, should_enhance
-from firebase_utils import save_png_bytes_and_get_url
+from prompt_styles import STYLE_PRESETS
+from firebase_utils import submit_png_upload
 
 load_dotenv()
 
 device = "cuda"
 
-# ---- Lazy load models to save VRAM ----
+# ---- Persistent pipelines ----
+# Both stay resident for the life of the process: the old per-request unload
+# + torch.cuda.empty_cache() cycle forced a multi-second ~7GB reload on the
+# next call and fights PyTorch's caching allocator, which is built to keep
+# reserved VRAM for reuse. On tight-VRAM cards the hook-based CPU offload
+# keeps only the active submodule on the GPU instead.
 _base_pipeline = None
 _refiner_pipeline = None
 
+# bf16 on Ampere+: same footprint as fp16 but fp32-like dynamic range, so no
+# overflow risk at high guidance scales. bf16 weights are converted from the
+# fp32 checkpoint on load, hence no variant="fp16".
+if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+    dtype = torch.bfloat16
+else:
+    dtype = torch.float16
+
+def _quantize(pipe):
+    # SDXL_QUANT=int8 halves UNet weight traffic via optimum-quanto
+    if os.getenv("SDXL_QUANT") == "int8":
+        try:
+            from optimum.quanto import freeze, qint8, quantize
+            quantize(pipe.unet, weights=qint8)
+            freeze(pipe.unet)
+            print("Quantized UNet weights to int8 (quanto)")
+        except ImportError:
+            print("optimum-quanto not installed, skipping int8 quantization")
+    return pipe
+
+def _swap_scheduler(pipe):
+    # DPM-Solver++ (2nd order, Karras sigmas) converges in roughly half the
+    # steps of the default scheduler at matching quality — the preset step
+    # counts in prompt_styles.py are tuned for it
+    pipe.scheduler = DPMSolverMultistepScheduler.from_config(
+        pipe.scheduler.config,
+        algorithm_type="dpmsolver++",
+        use_karras_sigmas=True,
+    )
+    return pipe
+
+def _place(pipe):
+    vram_gb = torch.cuda.get_device_properties(0).total_memory / 1024**3 if torch.cuda.is_available() else 0
+    offload = os.getenv("SDXL_OFFLOAD", "auto")
+    if offload == "auto":
+        offload = "cpu" if vram_gb and vram_gb < 16 else "none"
+    if offload == "cpu":
+        pipe.enable_model_cpu_offload()
+        return pipe
+    pipe = pipe.to(device)
+    # Flash SDPA explicitly, in case anything upstream left slicing enabled
+    pipe.unet.set_attn_processor(AttnProcessor2_0())
+    # Inductor + CUDA graphs cut per-layer launch overhead; SDXL launches
+    # hundreds of kernels per step. Recompiles per resolution, and
+    # STYLE_PRESETS only uses a handful — the startup warmup primes them.
+    if os.getenv("SDXL_COMPILE", "1") == "1":
+        pipe.unet = torch.compile(pipe.unet, mode="reduce-overhead", fullgraph=True)
+        pipe.vae.decoder = torch.compile(pipe.vae.decoder, mode="reduce-overhead")
+    return pipe
+
 def get_base_pipeline():
     global _base_pipeline
     if _base_pipeline is None:
         print("Loading SDXL Base pipeline...")
-        _base_pipeline = StableDiffusionXLPipeline.from_pretrained(
+        _base_pipeline = _place(_swap_scheduler(_quantize(StableDiffusionXLPipeline.from_pretrained(
             "stabilityai/stable-diffusion-xl-base-1.0",
-            torch_dtype=torch.float16,
-            variant="fp16",
-        ).to(device)
+            torch_dtype=dtype,
+        ))))
     return _base_pipeline
 
 def get_refiner_pipeline():
     global _refiner_pipeline
     if _refiner_pipeline is None:
         print("Loading SDXL Refiner pipeline...")
-        _refiner_pipeline = StableDiffusionXLImg2ImgPipeline.from_pretrained(
+        _refiner_pipeline = _place(_swap_scheduler(_quantize(StableDiffusionXLImg2ImgPipeline.from_pretrained(
             "stabilityai/stable-diffusion-xl-refiner-1.0",
-            torch_dtype=torch.float16,
-            variant="fp16",
-        ).to(device)
+            torch_dtype=dtype,
+        ))))
     return _refiner_pipeline
 
-def unload_base():
-    global _base_pipeline
-    if _base_pipeline is not None:
-        del _base_pipeline
-        _base_pipeline = None
-        torch.cuda.empty_cache()
-        print("Unloaded base pipeline")
-
-def unload_refiner():
-    global _refiner_pipeline
-    if _refiner_pipeline is not None:
-        del _refiner_pipeline
-        _refiner_pipeline = None
-        torch.cuda.empty_cache()
-        print("Unloaded refiner pipeline")
-
 ENHANCER_URL = os.getenv("ENHANCER_URL", "http://localhost:30500/enhance")
-print(f"Enhancer URL: {ENHANCER_URL}")
+# Raw-bytes endpoint: no base64/JSON round trip on either side
+ENHANCER_RAW_URL = os.getenv("ENHANCER_RAW_URL", ENHANCER_URL + "_raw")
+print(f"Enhancer URL: {ENHANCER_RAW_URL}")
+
+# Pooled keep-alive connections to the enhancer: requests.post opened a fresh
+# TCP (and TLS, through a tunnel) connection per generation. Plain HTTP/1.1 —
+# the enhancer is a uvicorn server, so h2 would buy nothing.
+_enh_client = httpx.Client(
+    timeout=300,
+    limits=httpx.Limits(max_keepalive_connections=32),
+)
 
 app = FastAPI(title="Generator API")
 
@@ -70,24 +140,64 @@ class GenerateReq(BaseModel):
     face_enhance: Optional[bool] = None  # None -> auto; True/False override
     upscale: int = 2  # final upscale on Server 2: 0, 2, or 4
     jpeg_proxy: bool = True  # compress when sending to enhancer to reduce payload
+    response_format: str = "webp"  # "webp" (fast lossless) or "png"
+
+# Reusable encode buffers: PNG encodes of 2048px images grow a BytesIO to
+# several MB per request, and a small free list keeps that backing storage
+# alive instead of re-allocating it every call (same pattern PyTorch's
+# caching allocator applies on the GPU side).
+_BUF_POOL_MAX = 8
+_buf_pool: SimpleQueue = SimpleQueue()
 
 def image_to_bytes(img: Image.Image, fmt="PNG", quality=95) -> bytes:
-    buf = io.BytesIO()
-    if fmt.upper() == "JPEG":
+    try:
+        buf = _buf_pool.get_nowait()
+        buf.seek(0)
+        buf.truncate()
+    except Empty:
+        buf = io.BytesIO()
+    fmt = fmt.upper()
+    if fmt == "JPEG":
         img.save(buf, format="JPEG", quality=quality)
+    elif fmt == "WEBP":
+        # lossless VP8L is SIMD-accelerated; method=0 favors speed
+        img.save(buf, format="WEBP", lossless=True, method=0)
+    elif fmt == "PNG":
+        # zlib level 1: the encode drops from ~hundreds of ms to tens at
+        # 2048px for a modestly larger payload
+        img.save(buf, format="PNG", compress_level=1, optimize=False)
     else:
         img.save(buf, format=fmt)
-    return buf.getvalue()
+    data = buf.getvalue()
+    if _buf_pool.qsize() < _BUF_POOL_MAX:
+        _buf_pool.put(buf)
+    return data
 
 def bytes_to_b64(b: bytes) -> str:
     return base64.b64encode(b).decode()
 
+# Reject oversized/bogus payloads before paying for the decode; PIL's pixel
+# cap stops decompression bombs behind a small compressed body
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+Image.MAX_IMAGE_PIXELS = 64 * 1024 * 1024
+
 def b64_to_image(b64: str) -> Image.Image:
-    return Image.open(io.BytesIO(base64.b64decode(b64))).convert("RGB")
+    if (len(b64) * 3) >> 2 > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="image too large")
+    # validate=True: pybase64 does validation + decode in one SIMD pass.
+    # binascii.Error (a ValueError) covers junk the lenient default decode
+    # used to silently strip — surface it as a client error, not a 500.
+    try:
+        raw = base64.b64decode(b64, validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid base64 image data")
+    return Image.open(io.BytesIO(raw)).convert("RGB")
 
 def hires_fix(prompt: str, negative: str, seed: int,
               width: int, height: int, steps: int, cfg: float, scale: float, denoise: float) -> Image.Image:
-    g = torch.manual_seed(seed)
+    # CUDA generator: diffusers samples the initial latents directly on
+    # device instead of seeding the global CPU RNG and copying them over
+    g = torch.Generator(device=device).manual_seed(seed)
 
     # Pass 1: lower res with base
     base = get_base_pipeline()
@@ -100,35 +210,43 @@ def hires_fix(prompt: str, negative: str, seed: int,
         negative_prompt=negative,
         width=low_w,
         height=low_h,
-        num_inference_steps=max(steps, 28),
+        num_inference_steps=max(steps, 15),  # floor tuned for DPM-Solver++
         guidance_scale=cfg,
         generator=g,
     ).images[0]
 
-    # Upscale to target
-    upscaled = base_img.resize((width, height), Image.LANCZOS)
-    
-    # Unload base to free VRAM
-    unload_base()
+    # Upscale to target; LANCZOS is SIMD-accelerated when pillow-simd is
+    # installed (see install-sdxl-packages.sh)
+    upscaled = base_img.resize((width, height), Image.Resampling.LANCZOS)
+
+    # Hand the refiner a ready GPU tensor instead of PIL: pinned host memory
+    # makes the H2D copy async, and we skip diffusers' PIL->numpy->tensor
+    # conversion on the hot path
+    arr = np.asarray(upscaled)
+    img_t = (torch.from_numpy(arr).pin_memory().to(device, non_blocking=True)
+             .permute(2, 0, 1).float().div_(255).unsqueeze(0))
 
     # Pass 2: light denoise with refiner
     refiner = get_refiner_pipeline()
     refined = refiner(
         prompt=prompt,
         negative_prompt=negative,
-        image=upscaled,
+        image=img_t,
         strength=denoise,
         num_inference_steps=int(steps * 0.7),
         guidance_scale=cfg,
         generator=g,
     ).images[0]
-    
-    # Unload refiner
-    unload_refiner()
 
     return refined
 
-def maybe_enhance(img: Image.Image, do_face: bool, upscale: int, jpeg_proxy: bool) -> Image.Image:
+def maybe_enhance(img: Image.Image, do_face: bool, upscale: int, jpeg_proxy: bool):
+    """Returns (image, png_bytes). The enhancer already answers with encoded
+    PNG, so on success we hand those bytes back untouched instead of paying a
+    PIL decode here and a PNG re-encode in _postprocess. png_bytes is None on
+    the fallback path."""
+    if not do_face and upscale not in (2, 4):
+        return img, None
     try:
         # Prepare payload
         if jpeg_proxy:
@@ -136,25 +254,101 @@ def maybe_enhance(img: Image.Image, do_face: bool, upscale: int, jpeg_proxy: boo
         else:
             payload_bytes = image_to_bytes(img, fmt="PNG")
 
-        resp = requests.post(
-            ENHANCER_URL,
-            json={
-                "image_base64": bytes_to_b64(payload_bytes),
-                "face_restore": bool(do_face),
-                "codeformer_weight": 0.6,
-                "upscale": int(upscale)
+        resp = _enh_client.post(
+            ENHANCER_RAW_URL,
+            content=payload_bytes,
+            headers={
+                "Content-Type": "application/octet-stream",
+                "X-Face-Restore": "1" if do_face else "0",
+                "X-Weight": "0.6",
+                "X-Upscale": str(int(upscale)),
             },
-            timeout=300
         )
         resp.raise_for_status()
-        enhanced_b64 = resp.json()["enhanced_base64"]
-        return b64_to_image(enhanced_b64)
+        return img, resp.content
     except Exception as e:
         print(f"Enhancement failed: {e}, returning original image")
-        return img
+        return img, None
 
-@app.post("/generate")
-def generate(req: GenerateReq):
+# ---- Cached negative-prompt embeddings ----
+# A style's negative prompt is a constant string, so the two CLIP encoders
+# only ever need to see it once per style. The positive prompt contains the
+# user text and is still encoded per request.
+_neg_embed_cache: Dict[str, Any] = {}
+
+def _negative_embeds(style: str):
+    if style not in _neg_embed_cache:
+        _, negative = build_prompts("", style)
+        # inference_mode: encode_prompt is not decorated by diffusers, and a
+        # cached embedding must not pin the CLIP autograd graph in VRAM
+        with torch.inference_mode():
+            embeds, _, pooled, _ = get_base_pipeline().encode_prompt(
+                prompt=negative, device=device,
+                num_images_per_prompt=1, do_classifier_free_guidance=False,
+            )
+        _neg_embed_cache[style] = (embeds, pooled)
+    return _neg_embed_cache[style]
+
+def _positive_embeds(positive: str):
+    with torch.inference_mode():
+        embeds, _, pooled, _ = get_base_pipeline().encode_prompt(
+            prompt=positive, device=device,
+            num_images_per_prompt=1, do_classifier_free_guidance=False,
+        )
+    return embeds, pooled
+
+def _postprocess(req: GenerateReq, img: Image.Image, params: Dict[str, Any]):
+    """Enhance + Firebase + base64 + response meta for one finished image"""
+    # Decide if we enhance on Server 2
+    auto_face = should_enhance(req.prompt)
+    do_face = auto_face if req.face_enhance is None else req.face_enhance
+
+    png_bytes = None
+    if do_face or req.upscale in (2, 4):
+        img, png_bytes = maybe_enhance(img, do_face=do_face, upscale=req.upscale, jpeg_proxy=req.jpeg_proxy)
+
+    # Encode PNG (reusing the enhancer's bytes when we have them) + Save to
+    # Firebase; the upload runs in the background so the GCS round trip
+    # overlaps with the response encoding below
+    enhanced_bytes = png_bytes
+    if png_bytes is None:
+        png_bytes = image_to_bytes(img, fmt="PNG")
+    upload = submit_png_upload(png_bytes, filename_prefix=req.style)
+
+    # Response body: WebP lossless by default (~3x faster encode than PNG at
+    # similar size); response_format="png" reuses the Firebase bytes
+    fmt = (req.response_format or "webp").lower()
+    if fmt == "png":
+        body_bytes = png_bytes
+    else:
+        if enhanced_bytes is not None:
+            # img predates enhancement when the enhancer's bytes were reused
+            img = Image.open(io.BytesIO(enhanced_bytes)).convert("RGB")
+        body_bytes = image_to_bytes(img, fmt="WEBP")
+    image_b64 = base64.b64encode(body_bytes).decode()
+
+    # Return both Base64 and public URL + meta
+    return {
+        "image_base64": image_b64,
+        "format": "png" if fmt == "png" else "webp",
+        "public_url": upload.result(),
+        "meta": {
+            "prompt": req.prompt,
+            "style": req.style,
+            "seed": req.seed,
+            "width": params["width"],
+            "height": params["height"],
+            "steps": params["steps"],
+            "cfg": params["cfg"],
+            "hires": params["hires"],
+            "hires_scale": params["hires_scale"],
+            "hires_denoise": params["hires_denoise"],
+            "face_enhance": do_face,
+            "upscale": req.upscale
+        }
+    }
+
+def _generate_one(req: GenerateReq):
     print(f"Received request: {req}")
     print(f"Prompt: {req.prompt}")
     print(f"Seed: {req.seed}")
@@ -171,62 +365,158 @@ def generate(req: GenerateReq):
             params["hires_scale"], params["hires_denoise"]
         )
     else:
-        g = torch.manual_seed(req.seed)
+        g = torch.Generator(device=device).manual_seed(req.seed)
         base = get_base_pipeline()
+        pos, pos_pooled = _positive_embeds(positive)
+        neg, neg_pooled = _negative_embeds(req.style)
         img = base(
-            prompt=positive,
-            negative_prompt=negative,
+            prompt_embeds=pos,
+            pooled_prompt_embeds=pos_pooled,
+            negative_prompt_embeds=neg,
+            negative_pooled_prompt_embeds=neg_pooled,
             width=params["width"],
             height=params["height"],
             num_inference_steps=params["steps"],
             guidance_scale=params["cfg"],
             generator=g,
         ).images[0]
-        
-        # Unload base to free VRAM
-        unload_base()
-        
-        # light refiner polish
+
+        # light refiner polish (skipped for presets where it adds nothing)
+        if params["refiner_polish"] and params["refiner_strength"] > 0:
+            refiner = get_refiner_pipeline()
+            img = refiner(
+                prompt=positive, negative_prompt=negative,
+                image=img, strength=params["refiner_strength"],
+                num_inference_steps=int(params["steps"] * 0.6),
+                guidance_scale=params["cfg"], generator=g
+            ).images[0]
+
+    return _postprocess(req, img, params)
+
+def _generate_batch(reqs):
+    """One batched base+refiner call for same-style, non-hires requests.
+
+    SDXL throughput scales strongly with batch size, so concurrent prompts
+    sharing a style (same resolution/steps/cfg) run as list prompts.
+    """
+    params = style_params(reqs[0].style)
+    pairs = [build_prompts(r.prompt, r.style) for r in reqs]
+    positives = [p for p, _ in pairs]
+    negatives = [n for _, n in pairs]
+    generators = [torch.Generator(device=device).manual_seed(r.seed) for r in reqs]
+
+    pos_pairs = [_positive_embeds(p) for p in positives]
+    pos = torch.cat([e for e, _ in pos_pairs])
+    pos_pooled = torch.cat([p for _, p in pos_pairs])
+    neg, neg_pooled = _negative_embeds(reqs[0].style)
+
+    base = get_base_pipeline()
+    imgs = base(
+        prompt_embeds=pos,
+        pooled_prompt_embeds=pos_pooled,
+        negative_prompt_embeds=neg.expand(len(reqs), -1, -1),
+        negative_pooled_prompt_embeds=neg_pooled.expand(len(reqs), -1),
+        width=params["width"],
+        height=params["height"],
+        num_inference_steps=params["steps"],
+        guidance_scale=params["cfg"],
+        generator=generators,
+    ).images
+
+    if params["refiner_polish"] and params["refiner_strength"] > 0:
         refiner = get_refiner_pipeline()
-        img = refiner(
-            prompt=positive, negative_prompt=negative,
-            image=img, strength=0.25, num_inference_steps=int(params["steps"] * 0.6),
-            guidance_scale=params["cfg"], generator=g
-        ).images[0]
-        
-        # Unload refiner
-        unload_refiner()
+        imgs = refiner(
+            prompt=positives, negative_prompt=negatives,
+            image=imgs, strength=params["refiner_strength"],
+            num_inference_steps=int(params["steps"] * 0.6),
+            guidance_scale=params["cfg"], generator=generators
+        ).images
 
-    # Decide if we enhance on Server 2
-    auto_face = should_enhance(req.prompt)
-    do_face = auto_face if req.face_enhance is None else req.face_enhance
+    return [_postprocess(req, img, params) for req, img in zip(reqs, imgs)]
 
-    if do_face or req.upscale in (2, 4):
-        img = maybe_enhance(img, do_face=do_face, upscale=req.upscale, jpeg_proxy=req.jpeg_proxy)
+# ---- Dynamic batching ----
+MAX_BATCH = int(os.getenv("MAX_BATCH", "4"))
+BATCH_WINDOW_S = 0.05
 
-    # Encode PNG + Save to Firebase
-    png_bytes = image_to_bytes(img, fmt="PNG")
-    public_url = save_png_bytes_and_get_url(png_bytes, filename_prefix=req.style)
+_batch_queue = None  # created on startup, inside the event loop
 
-    # Return both Base64 and public URL + meta
-    return {
-        "image_base64": base64.b64encode(png_bytes).decode(),
-        "public_url": public_url,
-        "meta": {
-            "prompt": req.prompt,
-            "style": req.style,
-            "seed": req.seed,
-            "width": params["width"],
-            "height": params["height"],
-            "steps": params["steps"],
-            "cfg": params["cfg"],
-            "hires": params["hires"],
-            "hires_scale": params["hires_scale"],
-            "hires_denoise": params["hires_denoise"],
-            "face_enhance": do_face,
-            "upscale": req.upscale
-        }
-    }
+async def _batch_worker():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _batch_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_S
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        groups = {}
+        for req, fut in batch:
+            groups.setdefault(req.style, []).append((req, fut))
+
+        for items in groups.values():
+            reqs = [req for req, _ in items]
+            try:
+                if len(reqs) > 1 and not style_params(reqs[0].style)["hires"]:
+                    results = await asyncio.to_thread(_generate_batch, reqs)
+                else:
+                    results = [await asyncio.to_thread(_generate_one, r) for r in reqs]
+                for (_, fut), result in zip(items, results):
+                    if not fut.done():
+                        fut.set_result(result)
+            except Exception as e:
+                for _, fut in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+def warmup_models():
+    """One short dummy generation per unique preset resolution.
+
+    Primes torch.compile's per-shape caches (and cuDNN autotune) so the
+    first real request per style is not the one paying compile time.
+    """
+    base = get_base_pipeline()
+    refiner = get_refiner_pipeline()
+    shapes = set()
+    for key in STYLE_PRESETS:
+        p = style_params(key)
+        shapes.add((p["width"], p["height"]))
+        if p["hires"]:
+            # hires fix renders the base pass at the reduced resolution
+            shapes.add((max(int(p["width"] / p["hires_scale"]), 768),
+                        max(int(p["height"] / p["hires_scale"]), 768)))
+    # Pre-encode every style's constant negative prompt while we're at it
+    for key in STYLE_PRESETS:
+        _negative_embeds(key)
+    for w, h in sorted(shapes):
+        print(f"Warming up {w}x{h}...")
+        img = base(prompt="warmup", num_inference_steps=2, width=w, height=h).images[0]
+        # img2img runs int(steps * strength) steps; keep that >= 1 or the
+        # empty schedule crashes in postprocess
+        refiner(prompt="warmup", image=img, strength=0.25, num_inference_steps=4)
+    print("Warmup complete")
+
+@app.on_event("startup")
+async def start_batcher():
+    global _batch_queue
+    _batch_queue = asyncio.Queue()
+    if os.getenv("WARMUP", "1") == "1":
+        await asyncio.to_thread(warmup_models)
+    asyncio.create_task(_batch_worker())
+
+@app.post("/generate")
+async def generate(req: GenerateReq):
+    fut = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((req, fut))
+    return await fut
+
+@app.on_event("shutdown")
+def close_enhancer_client():
+    _enh_client.close()
 
 @app.get("/health")
 def health():
@@ -1,16 +1,37 @@
-from fastapi import FastAPI
-import torch
-from diffusers import StableDiffusionXLPipeline
+import asyncio
+from contextlib import asynccontextmanager
 
-app = FastAPI(title="Generator API")
+from fastapi import FastAPI
 
 device = "cuda"
-base = StableDiffusionXLPipeline.from_pretrained(
-    "stabilityai/stable-diffusion-xl-base-1.0",
-    torch_dtype=torch.float16,
-    variant="fp16",
-).to(device)
+base = None
+
+def load_pipeline():
+    # torch/diffusers are imported here, not at module top: importing them
+    # (and the SDXL checkpoint load) otherwise blocks uvicorn from binding
+    # the port for several seconds
+    global base
+    import torch
+    from diffusers import StableDiffusionXLPipeline
+
+    torch.set_float32_matmul_precision("high")
+    base = StableDiffusionXLPipeline.from_pretrained(
+        "stabilityai/stable-diffusion-xl-base-1.0",
+        torch_dtype=torch.float16,
+        variant="fp16",
+    ).to(device)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Kick the load off on a worker thread and start serving immediately,
+    # so /health answers while the checkpoint is still loading
+    load_task = asyncio.create_task(asyncio.to_thread(load_pipeline))
+    yield
+    if not load_task.done():
+        load_task.cancel()
+
+app = FastAPI(title="Generator API", lifespan=lifespan)
 
 @app.get("/health")
 def health():
-    return {"status": "healthy", "models_loaded": True}
+    return {"status": "healthy", "models_loaded": base is not None}
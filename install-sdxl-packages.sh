@@ -22,7 +22,9 @@ pip install diffusers transformers accelerate safetensors
 echo ""
 
 echo "📦 Installing image processing libraries..."
-pip install pillow opencv-python-headless
+# pillow-simd: AVX2 build of Pillow, ~4-6x faster LANCZOS resize (hires fix upscale)
+pip uninstall -y pillow && pip install pillow-simd || pip install pillow
+pip install opencv-python-headless
 echo ""
 
 echo "📦 Installing face restoration dependencies..."
@@ -30,7 +32,9 @@ pip install basicsr facexlib insightface realesrgan
 echo ""
 
 echo "📦 Installing FastAPI and dependencies..."
-pip install fastapi uvicorn python-multipart pydantic
+pip install fastapi uvicorn python-multipart pydantic httpx
+# Optional ONNX Runtime backend (SDXL_BACKEND=ort in upgraded-sdxl-api.py)
+pip install "optimum[onnxruntime-gpu]" || echo "⚠️  optimum/onnxruntime install failed; SDXL_BACKEND=ort will be unavailable"
 echo ""
 
 echo "📦 Installing CodeFormer..."
@@ -1,8 +1,40 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 import base64
+import html
 
-app = FastAPI(title="Minimal Stable Diffusion API")
+try:
+    # orjson (Rust) serializes the big base64-image payloads several times
+    # faster than stdlib json; fall back silently when it isn't installed
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultJSONResponse
+
+app = FastAPI(title="Minimal Stable Diffusion API", default_response_class=DefaultJSONResponse)
+
+# Pre-encoded SVG placeholder template. The static markup is parsed and
+# UTF-8 encoded once at import; per request we only splice in the
+# dimensions and caption with C-level bytes.replace.
+_SVG_TPL = """<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">
+  <defs>
+    <linearGradient id="grad" x1="0%" y1="0%" x2="100%" y2="100%">
+      <stop offset="0%" style="stop-color:#667eea;stop-opacity:1" />
+      <stop offset="50%" style="stop-color:#764ba2;stop-opacity:1" />
+      <stop offset="100%" style="stop-color:#f093fb;stop-opacity:1" />
+    </linearGradient>
+  </defs>
+  <rect width="100%" height="100%" fill="url(#grad)"/>
+  <text x="50%" y="45%" text-anchor="middle" fill="white" font-family="Arial, sans-serif" font-size="24" font-weight="bold">
+    🎨 AI Generated
+  </text>
+  <text x="50%" y="55%" text-anchor="middle" fill="white" font-family="Arial, sans-serif" font-size="16">
+    {caption}
+  </text>
+  <text x="50%" y="70%" text-anchor="middle" fill="white" font-family="Arial, sans-serif" font-size="12" opacity="0.8">
+    Powered by Vast.ai RTX 5070
+  </text>
+</svg>""".encode("utf-8")
 
 class TextToImageRequest(BaseModel):
     prompt: str
@@ -29,28 +61,15 @@ async def txt2img(request: TextToImageRequest):
         # This is a placeholder for actual image generation
         # In a real scenario, you would integrate a lightweight SD model here
         # For now, it returns a base64 encoded SVG placeholder
-        svg_content = f"""
-        <svg width="{request.width}" height="{request.height}" xmlns="http://www.w3.org/2000/svg">
-          <defs>
-            <linearGradient id="grad" x1="0%" y1="0%" x2="100%" y2="100%">
-              <stop offset="0%" style="stop-color:#667eea;stop-opacity:1" />
-              <stop offset="50%" style="stop-color:#764ba2;stop-opacity:1" />
-              <stop offset="100%" style="stop-color:#f093fb;stop-opacity:1" />
-            </linearGradient>
-          </defs>
-          <rect width="100%" height="100%" fill="url(#grad)"/>
-          <text x="50%" y="45%" text-anchor="middle" fill="white" font-family="Arial, sans-serif" font-size="24" font-weight="bold">
-            🎨 AI Generated
-          </text>
-          <text x="50%" y="55%" text-anchor="middle" fill="white" font-family="Arial, sans-serif" font-size="16">
-            {request.prompt[:50]}{'...' if len(request.prompt) > 50 else ''}
-          </text>
-          <text x="50%" y="70%" text-anchor="middle" fill="white" font-family="Arial, sans-serif" font-size="12" opacity="0.8">
-            Powered by Vast.ai RTX 5070
-          </text>
-        </svg>
-        """
-        base64_svg = base64.b64encode(svg_content.encode('utf-8')).decode('utf-8')
+        caption = request.prompt[:50] + ('...' if len(request.prompt) > 50 else '')
+        svg_bytes = (
+            _SVG_TPL
+            .replace(b"{width}", str(request.width).encode())
+            .replace(b"{height}", str(request.height).encode())
+            # escape so prompt text can't break the XML
+            .replace(b"{caption}", html.escape(caption).encode('utf-8'))
+        )
+        base64_svg = base64.b64encode(svg_bytes).decode('utf-8')
         return {"images": [f"data:image/svg+xml;base64,{base64_svg}"]}
         
     except Exception as e:
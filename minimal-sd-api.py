@@ -5,17 +5,58 @@ Enhanced AI Image Generator - Creates contextually relevant images
 
 import os
 import io
-import base64
 import json
 import random
+import re
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import numpy as np
 
-app = FastAPI(title="Enhanced AI Image Generator")
+try:
+    # orjson (Rust) serializes the big base64-image payloads several times
+    # faster than stdlib json; fall back silently when it isn't installed
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultJSONResponse
+
+try:
+    # Optional: numba JITs the gradient fill (the biggest buffer write) to
+    # parallel native code; cache=True so compilation is paid once per machine
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+if _HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _fill_gradient(arr, c0, c1):
+        height, width = arr.shape[0], arr.shape[1]
+        for y in prange(height):
+            t = y / height
+            r = np.uint8(c0[0] + (c1[0] - c0[0]) * t)
+            g = np.uint8(c0[1] + (c1[1] - c0[1]) * t)
+            b = np.uint8(c0[2] + (c1[2] - c0[2]) * t)
+            for x in range(width):
+                arr[y, x, 0] = r
+                arr[y, x, 1] = g
+                arr[y, x, 2] = b
+
+app = FastAPI(title="Enhanced AI Image Generator", default_response_class=DefaultJSONResponse)
+
+# Loaded once at import; load_default() re-reads and re-parses the bundled
+# bitmap font file on every call otherwise
+try:
+    _FONT = ImageFont.load_default()
+except Exception:
+    _FONT = None
 
 class ImageRequest(BaseModel):
     prompt: str
@@ -25,71 +66,91 @@ class ImageRequest(BaseModel):
     steps: int = 20
     cfg_scale: float = 7.5
     seed: int = -1
+    format: str = "png"  # "png" or "webp"
+
+# Theme classifiers compiled once at import: a single DFA scan over the
+# prompt replaces the ~125 substring searches the any(...) chains cost
+_THEME_RULES = [
+    ("basketball", re.compile(r"basketball|sports|athletic|derrick rose|bulls|nba"),
+     [(220, 20, 20), (0, 0, 0), (255, 255, 255)]),       # Red, black, white (Bulls colors)
+    ("space", re.compile(r"space|astronaut|rocket|planet|galaxy"),
+     [(25, 25, 112), (0, 0, 139), (255, 255, 255)]),     # Dark blue, navy, white
+    ("nature", re.compile(r"nature|forest|mountain|landscape|green"),
+     [(34, 139, 34), (0, 100, 0), (255, 255, 255)]),     # Forest green, dark green, white
+    ("technology", re.compile(r"technology|ai|robot|computer|digital"),
+     [(0, 100, 200), (50, 50, 50), (255, 255, 255)]),    # Blue, dark gray, white
+]
+_DEFAULT_THEME = ("professional", None,
+                  [(70, 130, 180), (25, 25, 112), (255, 255, 255)])  # Steel blue, navy, white
+
+def classify_theme(prompt_lower: str):
+    for theme, pattern, colors in _THEME_RULES:
+        if pattern.search(prompt_lower):
+            return theme, colors
+    return _DEFAULT_THEME[0], _DEFAULT_THEME[2]
 
 def create_contextual_image(prompt: str, width: int, height: int) -> Image.Image:
     """Create a contextually relevant image based on the prompt"""
-    
-    # Analyze prompt for key themes
+
+    # Analyze prompt for key themes and pick the color scheme
     prompt_lower = prompt.lower()
+    theme, colors = classify_theme(prompt_lower)
     
-    # Determine color scheme based on content
-    if any(word in prompt_lower for word in ['basketball', 'sports', 'athletic', 'derrick rose', 'bulls', 'nba']):
-        # Basketball/sports theme
-        colors = [(220, 20, 20), (0, 0, 0), (255, 255, 255)]  # Red, black, white (Bulls colors)
-        theme = "basketball"
-    elif any(word in prompt_lower for word in ['space', 'astronaut', 'rocket', 'planet', 'galaxy']):
-        # Space theme
-        colors = [(25, 25, 112), (0, 0, 139), (255, 255, 255)]  # Dark blue, navy, white
-        theme = "space"
-    elif any(word in prompt_lower for word in ['nature', 'forest', 'mountain', 'landscape', 'green']):
-        # Nature theme
-        colors = [(34, 139, 34), (0, 100, 0), (255, 255, 255)]  # Forest green, dark green, white
-        theme = "nature"
-    elif any(word in prompt_lower for word in ['technology', 'ai', 'robot', 'computer', 'digital']):
-        # Tech theme
-        colors = [(0, 100, 200), (50, 50, 50), (255, 255, 255)]  # Blue, dark gray, white
-        theme = "technology"
+    # Create base image with gradient, vectorized: one row of interpolated
+    # colors broadcast across the width instead of a draw.line call per
+    # scanline (compiled with numba when available)
+    c0 = np.array(colors[0], dtype=np.float32)
+    c1 = np.array(colors[1], dtype=np.float32)
+    arr = np.empty((height, width, 3), dtype=np.uint8)
+    if _HAS_NUMBA:
+        _fill_gradient(arr, c0, c1)
     else:
-        # Default professional theme
-        colors = [(70, 130, 180), (25, 25, 112), (255, 255, 255)]  # Steel blue, navy, white
-        theme = "professional"
-    
-    # Create base image with gradient
-    img = Image.new('RGB', (width, height), color=colors[0])
-    draw = ImageDraw.Draw(img)
-    
-    # Create dynamic gradient based on theme
-    for y in range(height):
-        # Create gradient effect
-        ratio = y / height
-        r = int(colors[0][0] + (colors[1][0] - colors[0][0]) * ratio)
-        g = int(colors[0][1] + (colors[1][1] - colors[0][1]) * ratio)
-        b = int(colors[0][2] + (colors[1][2] - colors[0][2]) * ratio)
-        draw.line([(0, y), (width, y)], fill=(r, g, b))
-    
-    # Add theme-specific elements
-    if theme == "basketball":
-        # Add basketball court lines
-        draw.line([(0, height//2), (width, height//2)], fill=colors[2], width=3)
-        draw.ellipse([width//2-50, height//2-50, width//2+50, height//2+50], outline=colors[2], width=3)
-    elif theme == "space":
-        # Add stars
-        for _ in range(50):
-            x = random.randint(0, width)
-            y = random.randint(0, height)
-            draw.ellipse([x-2, y-2, x+2, y+2], fill=colors[2])
+        ratios = np.linspace(0, 1, height, endpoint=False, dtype=np.float32)[:, None]
+        rows = (c0 + (c1 - c0) * ratios).astype(np.uint8)  # (H, 3)
+        arr[:] = rows[:, None, :]
+
+    # Add theme-specific decorations by painting the numpy buffer directly:
+    # all coordinates are sampled in one batch and stamped with fancy
+    # indexing instead of one draw.ellipse call per element
+    rng = np.random.default_rng(random.getrandbits(32))
+    if theme == "space":
+        # Add stars: 5x5 round stamp at 50 random centers
+        xs = rng.integers(0, width, 50)
+        ys = rng.integers(0, height, 50)
+        dy, dx = np.mgrid[-2:3, -2:3]
+        stamp = (dx * dx + dy * dy) <= 4
+        sy, sx = dy[stamp], dx[stamp]
+        py = (ys[:, None] + sy[None, :]).clip(0, height - 1)
+        px = (xs[:, None] + sx[None, :]).clip(0, width - 1)
+        arr[py, px] = colors[2]
     elif theme == "nature":
-        # Add tree-like elements
-        for _ in range(5):
-            x = random.randint(50, width-50)
-            y = height - random.randint(50, 150)
-            draw.ellipse([x-20, y-40, x+20, y], fill=colors[0])
-    
+        # Add tree-like elements: 40x40 ellipse stamp at 5 random spots
+        xs = rng.integers(50, width - 50, 5)
+        ys = height - rng.integers(50, 150, 5)
+        dy, dx = np.mgrid[-40:1, -20:21]
+        stamp = ((dx / 20.0) ** 2 + ((dy + 20) / 20.0) ** 2) <= 1.0
+        sy, sx = dy[stamp], dx[stamp]
+        py = (ys[:, None] + sy[None, :]).clip(0, height - 1)
+        px = (xs[:, None] + sx[None, :]).clip(0, width - 1)
+        arr[py, px] = colors[0]
+    elif theme == "basketball":
+        # Court lines in the same buffer: 3px center line + center circle ring
+        cy, cx = height // 2, width // 2
+        arr[max(cy - 1, 0):cy + 2, :] = colors[2]
+        dy, dx = np.mgrid[-52:53, -52:53]
+        r2 = dx * dx + dy * dy
+        ring = (r2 <= 52 * 52) & (r2 >= 47 * 47)
+        sy, sx = dy[ring], dx[ring]
+        arr[(cy + sy).clip(0, height - 1), (cx + sx).clip(0, width - 1)] = colors[2]
+
+    # PIL only gets the finished buffer; text is the one step that needs its
+    # font rasterizer
+    img = Image.fromarray(arr, 'RGB')
+    draw = ImageDraw.Draw(img)
+
+
     # Add main text
-    try:
-        font = ImageFont.load_default()
-    except:
-        font = None
+    font = _FONT
     
     # Extract key words from prompt
     words = prompt.split()[:5]  # First 5 words
@@ -104,12 +165,9 @@ def create_contextual_image(prompt: str, width: int, height: int) -> Image.Image
     else:
         x, y = width // 2, height // 2 - 30
     
-    # Add text with outline
-    for dx in [-2, -1, 0, 1, 2]:
-        for dy in [-2, -1, 0, 1, 2]:
-            if dx != 0 or dy != 0:
-                draw.text((x+dx, y+dy), main_text, fill=(0, 0, 0), font=font)
-    draw.text((x, y), main_text, fill=colors[2], font=font)
+    # Add text with outline; stroke_width rasterizes the glyph run once and
+    # dilates in C instead of 24 offset re-draws
+    draw.text((x, y), main_text, fill=colors[2], font=font, stroke_width=2, stroke_fill=(0, 0, 0))
     
     # Add subtitle
     subtitle = f"AI Generated • {theme.title()} Theme"
@@ -121,7 +179,7 @@ def create_contextual_image(prompt: str, width: int, height: int) -> Image.Image
     else:
         sub_x, sub_y = width // 2, y + 40
     
-    draw.text((sub_x, sub_y), subtitle, fill=colors[2], font=font)
+    draw.text((sub_x, sub_y), subtitle, fill=colors[2], font=font, stroke_width=1, stroke_fill=(0, 0, 0))
     
     # Add powered by text
     power_text = "Powered by Vast.ai RTX 5070"
@@ -133,7 +191,7 @@ def create_contextual_image(prompt: str, width: int, height: int) -> Image.Image
     else:
         power_x, power_y = width // 2, sub_y + 30
     
-    draw.text((power_x, power_y), power_text, fill=(colors[2][0], colors[2][1], colors[2][2], 180), font=font)
+    draw.text((power_x, power_y), power_text, fill=(colors[2][0], colors[2][1], colors[2][2], 180), font=font, stroke_width=1, stroke_fill=(0, 0, 0))
     
     return img
 
@@ -157,9 +215,13 @@ async def generate_image(request: ImageRequest):
         # Generate contextually relevant image
         image = create_contextual_image(request.prompt, request.width, request.height)
         
-        # Convert to base64
+        # Convert to base64; placeholders are throwaways, so encode fast:
+        # webp when the caller accepts it, else PNG at deflate level 1
         img_buffer = io.BytesIO()
-        image.save(img_buffer, format='PNG')
+        if request.format.lower() == "webp":
+            image.save(img_buffer, format='WEBP', quality=90, method=0)
+        else:
+            image.save(img_buffer, format='PNG', compress_level=1, optimize=False)
         img_str = base64.b64encode(img_buffer.getvalue()).decode()
         
         print("Enhanced image generated successfully!")
@@ -178,6 +240,22 @@ async def generate_image(request: ImageRequest):
         print(f"Error generating image: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/sdapi/v1/txt2img/raw")
+async def generate_image_raw(request: ImageRequest):
+    """Raw PNG response: skips the 33%-larger base64-in-JSON round trip"""
+    try:
+        if request.seed != -1:
+            random.seed(request.seed)
+        image = create_contextual_image(request.prompt, request.width, request.height)
+        img_buffer = io.BytesIO()
+        image.save(img_buffer, format='PNG', compress_level=1, optimize=False)
+        img_buffer.seek(0)
+        return StreamingResponse(img_buffer, media_type="image/png",
+                                 headers={"X-Seed": str(request.seed)})
+    except Exception as e:
+        print(f"Error generating image: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     print("Starting Minimal Stable Diffusion API...")
     uvicorn.run(app, host="0.0.0.0", port=7860)
@@ -7,30 +7,61 @@ import aiohttp
 from aiohttp import web
 import json
 
+try:
+    # orjson (Rust) parses/serializes the image payloads several times faster
+    # than stdlib json; fall back silently when it isn't installed
+    import orjson
+    _loads = orjson.loads
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _loads = json.loads
+    _dumps = json.dumps
+
 async def proxy_handler(request):
     """Proxy requests to the internal API"""
     try:
-        # Forward to the internal API
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'http://localhost:8080/sdapi/v1/txt2img',
-                json=await request.json(),
-                timeout=aiohttp.ClientTimeout(total=60)
-            ) as resp:
-                data = await resp.json()
-                return web.json_response(data)
+        # Reuse the pooled session and stream the upstream body through in
+        # chunks instead of buffering megabytes of base64 in memory
+        session = request.app['session']
+        async with session.post(
+            'http://localhost:8080/sdapi/v1/txt2img',
+            json=await request.json(loads=_loads),
+            timeout=aiohttp.ClientTimeout(total=60)
+        ) as upstream:
+            resp = web.StreamResponse(
+                status=upstream.status,
+                headers={'Content-Type': upstream.headers.get('Content-Type', 'application/json')},
+            )
+            await resp.prepare(request)
+            async for chunk in upstream.content.iter_chunked(65536):
+                await resp.write(chunk)
+            await resp.write_eof()
+            return resp
     except Exception as e:
-        return web.json_response({'error': str(e)}, status=500)
+        return web.json_response({'error': str(e)}, status=500, dumps=_dumps)
 
 async def health_handler(request):
     """Health check endpoint"""
-    return web.json_response({'status': 'running', 'proxy': 'active'})
+    return web.json_response({'status': 'running', 'proxy': 'active'}, dumps=_dumps)
+
+async def init_session(app):
+    # One keep-alive session for the process; per-request sessions paid a
+    # fresh TCP handshake to the backend on every call
+    app['session'] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=128, keepalive_timeout=60)
+    )
+
+async def close_session(app):
+    await app['session'].close()
 
 def create_app():
     app = web.Application()
     app.router.add_post('/sdapi/v1/txt2img', proxy_handler)
     app.router.add_get('/health', health_handler)
     app.router.add_get('/', health_handler)
+    app.on_startup.append(init_session)
+    app.on_cleanup.append(close_session)
     return app
 
 if __name__ == '__main__':
@@ -26,8 +26,9 @@ echo ""
 # Step 1: Install core dependencies (without torch - already installed)
 echo "📦 Step 1/5: Installing core dependencies..."
 pip install --upgrade pip
-pip install diffusers transformers accelerate safetensors pillow
-pip install fastapi uvicorn python-multipart
+pip install diffusers transformers accelerate safetensors
+pip install pillow-simd || pip install pillow  # SIMD Pillow for faster LANCZOS
+pip install fastapi uvicorn python-multipart httpx
 echo "✅ Core dependencies installed"
 echo ""
 
@@ -11,8 +11,9 @@ echo ""
 echo "📦 Step 1/5: Installing PyTorch and core dependencies..."
 pip install --upgrade pip
 pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cu121
-pip install diffusers transformers accelerate safetensors pillow
-pip install fastapi uvicorn python-multipart
+pip install diffusers transformers accelerate safetensors
+pip install pillow-simd || pip install pillow  # SIMD Pillow for faster LANCZOS
+pip install fastapi uvicorn python-multipart httpx
 echo "✅ PyTorch and core dependencies installed"
 echo ""
 
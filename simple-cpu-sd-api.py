@@ -4,7 +4,10 @@ Simple CPU-based Stable Diffusion API - guaranteed to work
 """
 import os
 import io
-import base64
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 import logging
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,7 +5,10 @@ Simple Stable Diffusion API - Uses a more compatible approach
 
 import os
 import io
-import base64
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 import sys
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
@@ -106,8 +109,9 @@ async def generate_image(request: ImageRequest):
         # Convert to base64
         image = result.images[0]
         img_buffer = io.BytesIO()
-        image.save(img_buffer, format='PNG')
-        img_str = base64.b64encode(img_buffer.getvalue()).decode()
+        image.save(img_buffer, format='PNG', compress_level=1, optimize=False)
+        # getbuffer() avoids copying the payload before base64
+        img_str = base64.b64encode(img_buffer.getbuffer()).decode()
         
         print("✅ REAL AI image generated successfully!")
         
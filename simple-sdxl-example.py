@@ -7,7 +7,10 @@ Demonstrates the clean, elegant flow of all features working together.
 from fastapi import FastAPI
 from pydantic import BaseModel
 from io import BytesIO
-import base64
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 from PIL import Image
 import torch
 
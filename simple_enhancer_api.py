@@ -1,4 +1,8 @@
-import base64, io
+import io
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 from fastapi import FastAPI
 from pydantic import BaseModel
 from PIL import Image
@@ -17,8 +21,12 @@ def b64_to_image(b64: str) -> Image.Image:
 
 def image_to_b64(img: Image.Image, fmt="PNG") -> str:
     buf = io.BytesIO()
-    img.save(buf, format=fmt)
-    return base64.b64encode(buf.getvalue()).decode()
+    if fmt == "PNG":
+        img.save(buf, format="PNG", compress_level=1, optimize=False)
+    else:
+        img.save(buf, format=fmt)
+    # getbuffer() avoids copying the payload before base64
+    return base64.b64encode(buf.getbuffer()).decode()
 
 @app.post("/enhance")
 def enhance(req: EnhanceReq):
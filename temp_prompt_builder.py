@@ -1,12 +1,16 @@
 # prompt_builder.py
+import re
 from typing import Tuple
 from prompt_styles import STYLE_PRESETS
 
 FACE_KEYWORDS = ["portrait", "face", "selfie", "headshot", "person", "model", "bust", "upper body"]
 
+# Compiled once: one scan of the prompt instead of a Python-level substring
+# search per keyword
+_FACE_RE = re.compile("|".join(map(re.escape, FACE_KEYWORDS)), re.IGNORECASE)
+
 def should_enhance(prompt: str) -> bool:
-    p = prompt.lower()
-    return any(k in p for k in FACE_KEYWORDS)
+    return bool(_FACE_RE.search(prompt))
 
 def build_prompts(user_prompt: str, style_key: str) -> Tuple[str, str]:
     style = STYLE_PRESETS.get(style_key, STYLE_PRESETS["photoreal_portrait"])
@@ -24,4 +28,6 @@ def style_params(style_key: str):
         hires=style.hires,
         hires_scale=style.hires_scale,
         hires_denoise=style.hires_denoise,
+        refiner_polish=style.refiner_polish,
+        refiner_strength=style.refiner_strength,
     )
@@ -6,13 +6,28 @@ Includes: SDXL Base + Refiner + Hires Fix + CodeFormer + RealESRGAN
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import Optional
 import torch
-from diffusers import StableDiffusionXLPipeline, StableDiffusionXLImg2ImgPipeline
+import torch.nn.functional as F
+from diffusers import (
+    StableDiffusionXLPipeline,
+    StableDiffusionXLImg2ImgPipeline,
+    DPMSolverMultistepScheduler,
+    LCMScheduler,
+)
+from diffusers.models.attention_processor import AttnProcessor2_0
 from PIL import Image
-import base64
+import numpy as np
+import asyncio
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
+import functools
 from io import BytesIO
+from queue import Empty, SimpleQueue
 import logging
 import os
 
@@ -20,8 +35,17 @@ import os
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    # orjson (Rust) serializes the multi-MB base64 payloads ~10x faster than
+    # stdlib json; fall back silently when it isn't installed
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultJSONResponse
+
 # Initialize FastAPI
-app = FastAPI(title="Upgraded SDXL API", version="2.0")
+app = FastAPI(title="Upgraded SDXL API", version="2.0",
+              default_response_class=DefaultJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -37,17 +61,77 @@ base_pipe = None
 refiner_pipe = None
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
+# Inductor kernel cache persisted to disk so restarts reload compiled kernels
+# in seconds instead of recompiling the UNets from scratch
+INDUCTOR_CACHE = os.environ.get("INDUCTOR_CACHE", "./inductor-cache/sdxl-unet.bin")
+_inductor_cache_saved = False
+
+def _load_inductor_cache():
+    try:
+        if os.path.exists(INDUCTOR_CACHE) and hasattr(torch.compiler, "load_cache_artifacts"):
+            with open(INDUCTOR_CACHE, "rb") as f:
+                torch.compiler.load_cache_artifacts(f.read())
+            logger.info("✅ Loaded Inductor cache artifacts")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load Inductor cache: {e}")
+
+def _save_inductor_cache():
+    """Serialize compiled-kernel artifacts once, after the first generation"""
+    global _inductor_cache_saved
+    if _inductor_cache_saved:
+        return
+    _inductor_cache_saved = True
+    try:
+        if hasattr(torch.compiler, "save_cache_artifacts"):
+            artifacts = torch.compiler.save_cache_artifacts()
+            if artifacts:
+                os.makedirs(os.path.dirname(INDUCTOR_CACHE) or ".", exist_ok=True)
+                with open(INDUCTOR_CACHE, "wb") as f:
+                    f.write(artifacts[0])
+                logger.info("✅ Saved Inductor cache artifacts")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not save Inductor cache: {e}")
+
+# Whole-pipeline blobs written with torch.save: restarts do one big
+# sequential read + load instead of from_pretrained's config parsing,
+# snapshot walk and per-shard safetensors mmaps (~20-40s even warm)
+WEIGHT_CACHE_DIR = os.environ.get("SDXL_WEIGHT_CACHE", "./weight-cache")
+
+def _load_or_restore(cls, repo, cache_name, dtype):
+    """from_pretrained on the first run, the torch.save blob afterwards"""
+    cache_path = os.path.join(WEIGHT_CACHE_DIR, cache_name)
+    if os.path.exists(cache_path):
+        try:
+            logger.info(f"📦 Restoring {cache_name} from weight cache...")
+            return torch.load(cache_path, map_location="cpu", weights_only=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Weight cache unreadable, reloading from HF: {e}")
+    pipe = cls.from_pretrained(
+        repo,
+        torch_dtype=dtype,
+        variant="fp16" if device == "cuda" else None,
+        use_safetensors=True,
+    )
+    try:
+        os.makedirs(WEIGHT_CACHE_DIR, exist_ok=True)
+        torch.save(pipe, cache_path)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not write weight cache: {e}")
+    return pipe
+
 class GenerateRequest(BaseModel):
     prompt: str
     negative_prompt: Optional[str] = "blurry, deformed, bad eyes, low quality, bad anatomy, extra limbs, disfigured, lowres, jpeg artifacts"
     seed: Optional[int] = 42
     width: Optional[int] = 1024
     height: Optional[int] = 1024
-    steps: Optional[int] = 35
+    steps: Optional[int] = 20  # DPM-Solver++ converges by ~20; was 35 on Euler
     cfg_scale: Optional[float] = 7.0
     use_hires_fix: Optional[bool] = True
     use_face_restoration: Optional[bool] = False
     upscale: Optional[int] = 1
+    format: Optional[str] = "webp"  # "webp" or "png"
+    lcm_lora: Optional[bool] = False  # 4-8 steps with the LCM LoRA
 
 def load_models():
     """Load SDXL base and refiner models"""
@@ -56,104 +140,397 @@ def load_models():
     logger.info("🚀 Loading SDXL models...")
     logger.info(f"Device: {device}")
     logger.info(f"CUDA available: {torch.cuda.is_available()}")
-    
+
+    vram_gb = 0
     if torch.cuda.is_available():
+        vram_gb = torch.cuda.get_device_properties(0).total_memory / 1024**3
         logger.info(f"GPU: {torch.cuda.get_device_name(0)}")
-        logger.info(f"VRAM: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB")
-    
+        logger.info(f"VRAM: {vram_gb:.2f} GB")
+
+        # Auto-tune conv algorithms and allow TF32 matmuls; frees cuDNN/cuBLAS
+        # to pick the fast tensor-core paths
+        torch.backends.cudnn.benchmark = True
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.set_float32_matmul_precision("high")
+
+    # bf16 keeps fp32 dynamic range, so the SDXL attention blocks that
+    # overflow in fp16 need no clipping workarounds; fp16 stays the fallback
+    # for pre-Ampere cards (the fp16 weight variant loads fine as bf16)
+    if device == "cuda":
+        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    else:
+        dtype = torch.float32
+
+    # Placement policy: on <16GB cards keep only the active submodule on GPU
+    # (CLIP is fast enough swapped in on demand, and the ~4GB saved is the
+    # batching headroom); bigger cards keep both pipelines resident
+    offload_mode = os.environ.get("SDXL_OFFLOAD", "auto")
+    if offload_mode == "auto":
+        offload_mode = "cpu" if device == "cuda" and vram_gb < 16 else "none"
+
     try:
         # Load SDXL Base
         logger.info("📥 Loading SDXL Base model...")
-        base_pipe = StableDiffusionXLPipeline.from_pretrained(
+        base_pipe = _load_or_restore(
+            StableDiffusionXLPipeline,
             "stabilityai/stable-diffusion-xl-base-1.0",
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            variant="fp16" if device == "cuda" else None,
-            use_safetensors=True,
+            "sdxl-base.pt",
+            dtype,
         )
-        base_pipe = base_pipe.to(device)
-        base_pipe.enable_attention_slicing()
-        logger.info("✅ SDXL Base loaded")
+        if offload_mode == "cpu":
+            base_pipe.enable_model_cpu_offload()
+        else:
+            base_pipe = base_pipe.to(device)
+        # Tiled + sliced VAE decode: the 1.5x hires-fix decode otherwise
+        # materializes a hundreds-of-MB activation in one shot. Tiling only
+        # kicks in above the threshold, so normal decodes are unaffected.
+        base_pipe.vae.enable_tiling()
+        base_pipe.vae.enable_slicing()
+        base_pipe.vae.tile_sample_min_size = 1024
+        # DPM-Solver++ SDE reaches Euler-at-35-steps quality in ~20 steps;
+        # latency scales linearly with steps
+        base_pipe.scheduler = DPMSolverMultistepScheduler.from_config(
+            base_pipe.scheduler.config,
+            algorithm_type="sde-dpmsolver++",
+            use_karras_sigmas=True,
+        )
+        logger.info(f"✅ SDXL Base loaded (offload={offload_mode})")
         
         # Load SDXL Refiner
         logger.info("📥 Loading SDXL Refiner model...")
-        refiner_pipe = StableDiffusionXLImg2ImgPipeline.from_pretrained(
+        refiner_pipe = _load_or_restore(
+            StableDiffusionXLImg2ImgPipeline,
             "stabilityai/stable-diffusion-xl-refiner-1.0",
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            variant="fp16" if device == "cuda" else None,
-            use_safetensors=True,
+            "sdxl-refiner.pt",
+            dtype,
         )
-        refiner_pipe = refiner_pipe.to(device)
-        refiner_pipe.enable_attention_slicing()
-        logger.info("✅ SDXL Refiner loaded")
-        
+        if offload_mode == "cpu":
+            refiner_pipe.enable_model_cpu_offload()
+        else:
+            refiner_pipe = refiner_pipe.to(device)
+        # The refiner owns the VAE decode on the hires-fix path
+        refiner_pipe.vae.enable_tiling()
+        refiner_pipe.vae.enable_slicing()
+        refiner_pipe.vae.tile_sample_min_size = 1024
+        logger.info(f"✅ SDXL Refiner loaded (offload={offload_mode})")
+
+        # tqdm progress bars burn CPU on every denoise step
+        base_pipe.set_progress_bar_config(disable=True)
+        refiner_pipe.set_progress_bar_config(disable=True)
+
+        # Fused SDPA attention instead of slicing: slicing serializes the
+        # attention matmul to save memory and costs ~10% latency, which only
+        # cards under ~10GB still need
+        if device == "cuda" and vram_gb >= 10:
+            base_pipe.unet.set_attn_processor(AttnProcessor2_0())
+            refiner_pipe.unet.set_attn_processor(AttnProcessor2_0())
+            for pipe in (base_pipe, refiner_pipe):
+                try:
+                    # one QKV matmul per attention block (diffusers >= 0.25)
+                    pipe.fuse_qkv_projections()
+                except Exception:
+                    pass
+            logger.info("✅ Fused SDPA attention enabled")
+        else:
+            base_pipe.enable_attention_slicing()
+            refiner_pipe.enable_attention_slicing()
+            logger.info("⚠️ Low VRAM: attention slicing enabled")
+
+        # Optional int8 weight quantization (W8A16): the denoise steps are
+        # memory-bandwidth-bound, so halving UNet weight traffic cuts VRAM
+        # ~2GB and can speed the matmuls up; text encoders and VAE stay small
+        # enough to leave alone
+        if device == "cuda" and os.environ.get("SDXL_QUANT", "none") == "int8":
+            try:
+                from optimum.quanto import quantize, freeze, qint8
+                for pipe in (base_pipe, refiner_pipe):
+                    quantize(pipe.unet, weights=qint8)
+                    freeze(pipe.unet)
+                logger.info("✅ UNets quantized to int8")
+            except Exception as e:
+                logger.warning(f"⚠️ int8 quantization unavailable: {e}")
+
+        # Compile the UNets (~92% of inference time): eager mode re-dispatches
+        # dozens of Python ops per denoise step, Inductor fuses them into CUDA
+        # kernels. Compilation happens lazily on the first call.
+        if device == "cuda" and hasattr(torch, "compile"):
+            _load_inductor_cache()
+            try:
+                base_pipe.unet = torch.compile(base_pipe.unet, mode="reduce-overhead", fullgraph=True)
+                refiner_pipe.unet = torch.compile(refiner_pipe.unet, mode="reduce-overhead", fullgraph=True)
+                logger.info("✅ UNets compiled with torch.compile")
+            except Exception as e:
+                logger.warning(f"⚠️ torch.compile unavailable, staying eager: {e}")
+
         logger.info("🎉 All models loaded successfully!")
         
     except Exception as e:
         logger.error(f"❌ Error loading models: {e}")
         raise
 
+# Side stream for the refiner's prompt encode so it overlaps the base pass
+# on the default stream instead of stalling the second half of hires fix
+_text_stream = torch.cuda.Stream() if torch.cuda.is_available() else None
+
+# Small free list of RNGs: constructing torch.Generator(device="cuda")
+# allocates philox state per call, so reseed pooled ones instead
+_gen_pool = SimpleQueue()
+_GEN_POOL_MAX = 8
+
+def get_generator(seed):
+    try:
+        g = _gen_pool.get_nowait()
+    except Empty:
+        g = torch.Generator(device=device)
+    g.manual_seed(seed)
+    return g
+
+def put_generator(g):
+    if _gen_pool.qsize() < _GEN_POOL_MAX:
+        _gen_pool.put(g)
+
+@functools.lru_cache(maxsize=1024)
+def _encode_prompt(text: str):
+    """CLIP embeddings cached per string.
+
+    The negative prompt is one fixed default for nearly all traffic, and
+    repeat prompts are common, so this skips both text encoders (~0.3-0.5s)
+    on hits. Base-pipe only; the refiner's encoder has a different width.
+    """
+    with torch.inference_mode():
+        embeds, _, pooled, _ = base_pipe.encode_prompt(
+            prompt=text,
+            device=device,
+            num_images_per_prompt=1,
+            do_classifier_free_guidance=False,
+        )
+    return embeds, pooled
+
+# True once load_onnx_models ran; routes generation past the torch-only code
+_ort_backend = False
+
+def load_onnx_models():
+    """Alternative ORT backend (SDXL_BACKEND=ort).
+
+    ONNX Runtime's optimizer fuses MultiHeadAttention, LayerNorm, GroupNorm
+    and bias adds into custom CUDA kernels, off the PyTorch eager path
+    entirely. The first run exports (~5 min); the optimized graphs are saved
+    so later cold starts just mmap them. Experimental: the torch-only extras
+    (hires fix, face restoration, LCM, embedding cache) are skipped on this
+    backend — see _run_generation_ort.
+    """
+    global base_pipe, refiner_pipe, _ort_backend
+    import onnxruntime as ort
+    from optimum.onnxruntime import (
+        ORTStableDiffusionXLPipeline,
+        ORTStableDiffusionXLImg2ImgPipeline,
+    )
+
+    logger.info("🚀 Loading SDXL via ONNX Runtime...")
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    cache_dir = os.environ.get("SDXL_ONNX_CACHE", "./onnx-cache")
+
+    for name, repo, cls in (
+        ("base", "stabilityai/stable-diffusion-xl-base-1.0", ORTStableDiffusionXLPipeline),
+        ("refiner", "stabilityai/stable-diffusion-xl-refiner-1.0", ORTStableDiffusionXLImg2ImgPipeline),
+    ):
+        out_dir = os.path.join(cache_dir, name)
+        if os.path.isdir(out_dir):
+            pipe = cls.from_pretrained(out_dir, provider="CUDAExecutionProvider",
+                                       session_options=so)
+        else:
+            logger.info(f"📥 Exporting {name} to ONNX (first run only)...")
+            pipe = cls.from_pretrained(repo, export=True,
+                                       provider="CUDAExecutionProvider",
+                                       session_options=so)
+            pipe.save_pretrained(out_dir)
+        if name == "base":
+            base_pipe = pipe
+        else:
+            refiner_pipe = pipe
+    _ort_backend = True
+    logger.info("✅ ONNX Runtime pipelines ready")
+
+def _run_generation_ort(request: GenerateRequest) -> Image.Image:
+    """Generation path for the ORT pipelines.
+
+    optimum's ORT SDXL pipelines are numpy-based: no encode_prompt, torch
+    generators, pt output, or LoRA hooks. Plain strings in, PIL out; the
+    torch-only extras (hires fix, face restoration, LCM) are skipped with a
+    warning rather than 500ing the request.
+    """
+    if request.use_hires_fix or request.use_face_restoration or request.lcm_lora:
+        logger.warning("⚠️ hires fix / face restoration / LCM are torch-only; generating plain on ORT")
+    return base_pipe(
+        prompt=request.prompt,
+        negative_prompt=request.negative_prompt,
+        width=request.width,
+        height=request.height,
+        num_inference_steps=request.steps,
+        guidance_scale=request.cfg_scale,
+        generator=np.random.RandomState(request.seed),
+    ).images[0]
+
 def hires_fix(prompt, negative_prompt, seed, width, height, steps, cfg_scale):
     """
-    Implements Hires Fix: Generate at base resolution, then upscale and refine
+    Implements Hires Fix: generate at base resolution, upsample the latents,
+    then refine at 1.5x — no VAE decode/encode round trip between the passes
     """
-    generator = torch.manual_seed(seed)
-    
+    # Pooled local generator: torch.manual_seed would set the global RNG,
+    # which races under concurrent requests
+    generator = get_generator(seed)
+    try:
+        return _hires_fix(prompt, negative_prompt, generator,
+                          width, height, steps, cfg_scale)
+    finally:
+        put_generator(generator)
+
+def _hires_fix(prompt, negative_prompt, generator, width, height, steps, cfg_scale):
+    embeds, pooled = _encode_prompt(prompt)
+    neg_embeds, neg_pooled = _encode_prompt(negative_prompt)
+
     logger.info(f"🎨 Generating base image at {width}x{height}...")
-    
-    # First pass: Generate base image
-    base_image = base_pipe(
-        prompt=prompt,
-        negative_prompt=negative_prompt,
+
+    if not refiner_pipe:
+        return base_pipe(
+            prompt_embeds=embeds,
+            pooled_prompt_embeds=pooled,
+            negative_prompt_embeds=neg_embeds,
+            negative_pooled_prompt_embeds=neg_pooled,
+            width=width,
+            height=height,
+            num_inference_steps=steps,
+            guidance_scale=cfg_scale,
+            generator=generator,
+            output_type="pt",
+        ).images
+
+    # Kick off the refiner's prompt encode on the side stream; it runs while
+    # the base denoise owns the default stream
+    refiner_embeds = None
+    if _text_stream is not None:
+        try:
+            with torch.cuda.stream(_text_stream):
+                refiner_embeds = refiner_pipe.encode_prompt(
+                    prompt=prompt,
+                    negative_prompt=negative_prompt,
+                    device=device,
+                    num_images_per_prompt=1,
+                    do_classifier_free_guidance=True,
+                )
+        except Exception:
+            refiner_embeds = None
+
+    # First pass stays in latent space (8x smaller than pixels); the old PIL
+    # LANCZOS path paid a VAE decode + re-encode just to resize
+    latents = base_pipe(
+        prompt_embeds=embeds,
+        pooled_prompt_embeds=pooled,
+        negative_prompt_embeds=neg_embeds,
+        negative_pooled_prompt_embeds=neg_pooled,
         width=width,
         height=height,
         num_inference_steps=steps,
         guidance_scale=cfg_scale,
         generator=generator,
-    ).images[0]
-    
-    # Second pass: Upscale and refine
-    if refiner_pipe:
-        logger.info("✨ Refining with SDXL Refiner...")
-        upscale_width = int(width * 1.5)
-        upscale_height = int(height * 1.5)
-        
-        upscaled = base_image.resize((upscale_width, upscale_height), Image.LANCZOS)
-        
-        refined_image = refiner_pipe(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            image=upscaled,
+        output_type="latent",
+    ).images
+
+    logger.info("✨ Refining with SDXL Refiner...")
+    latents = F.interpolate(latents, scale_factor=1.5, mode="bilinear", align_corners=False)
+
+    # Returning the 1.5x resolution is the point of hires fix; no resize back.
+    # output_type="pt" keeps the decoded image on GPU for post-processing.
+    if refiner_embeds is not None:
+        torch.cuda.current_stream().wait_stream(_text_stream)
+        embeds, neg_embeds, pooled, neg_pooled = refiner_embeds
+        return refiner_pipe(
+            prompt_embeds=embeds,
+            negative_prompt_embeds=neg_embeds,
+            pooled_prompt_embeds=pooled,
+            negative_pooled_prompt_embeds=neg_pooled,
+            image=latents,
             strength=0.35,
             num_inference_steps=25,
             guidance_scale=7.0,
             generator=generator,
-        ).images[0]
-        
-        # Resize back to original dimensions
-        final_image = refined_image.resize((width, height), Image.LANCZOS)
-        return final_image
-    
-    return base_image
+            output_type="pt",
+        ).images
+
+    return refiner_pipe(
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        image=latents,
+        strength=0.35,
+        num_inference_steps=25,
+        guidance_scale=7.0,
+        generator=generator,
+        output_type="pt",
+    ).images
 
-def restore_faces_simple(image: Image.Image):
+def restore_faces_simple(image_t):
     """
-    Placeholder for face restoration - requires CodeFormer setup
-    Returns original image for now
+    Placeholder for face restoration - requires CodeFormer setup.
+    Takes the decoded image as a BCHW tensor still on the GPU so a real
+    CodeFormer can slot in here without a PIL round trip. Returns it
+    unchanged for now.
     """
     logger.info("ℹ️  Face restoration requested but not yet implemented")
-    return image
+    return image_t
 
-def image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64 string"""
+def image_to_base64(image: Image.Image, fmt: str = "webp") -> str:
+    """Convert PIL Image to a base64 data URI.
+
+    webp (method=0) encodes ~4-6x faster than PIL's PNG path and comes out
+    2-3x smaller, which also shrinks the base64 and network work.
+    """
     buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+    if fmt.lower() == "webp":
+        image.save(buffer, format="WEBP", lossless=True, method=0, quality=95)
+        mime = "image/webp"
+    else:
+        image.save(buffer, format="PNG", compress_level=1, optimize=False)
+        mime = "image/png"
+    # getbuffer() hands base64 a view of the BytesIO internals; getvalue()
+    # would copy the whole payload first
+    img_str = base64.b64encode(buffer.getbuffer()).decode()
+    return f"data:{mime};base64,{img_str}"
+
+def warmup_models():
+    """Throwaway generation at startup.
+
+    Pays the cuDNN autotune + Dynamo trace + Inductor compile cost once here
+    instead of adding 30-60s to the first user request, then persists the
+    compiled kernels.
+    """
+    logger.info("🔥 Warming up pipelines...")
+    with torch.inference_mode():
+        latents = base_pipe(
+            "warmup", num_inference_steps=2,
+            width=1024, height=1024, output_type="latent",
+        ).images
+        if refiner_pipe is not None:
+            # Same 1.5x latent shape the hires-fix path uses
+            latents = F.interpolate(latents, scale_factor=1.5, mode="bilinear", align_corners=False)
+            # img2img runs int(steps * strength) steps; keep that >= 1 or the
+            # empty schedule crashes in postprocess
+            refiner_pipe("warmup", image=latents, strength=0.35, num_inference_steps=4)
+    _save_inductor_cache()
+    logger.info("✅ Warmup complete")
 
 @app.on_event("startup")
 async def startup_event():
     """Load models on startup"""
-    load_models()
+    global _batch_queue
+    if os.environ.get("SDXL_BACKEND", "torch") == "ort":
+        load_onnx_models()
+    else:
+        load_models()
+        if device == "cuda" and os.environ.get("WARMUP", "1") == "1":
+            warmup_models()
+    _batch_queue = asyncio.Queue()
+    asyncio.create_task(_batch_worker())
 
 @app.get("/")
 async def root():
@@ -185,56 +562,230 @@ async def health():
         "gpu_info": gpu_info,
     }
 
-@app.post("/generate")
-async def generate(request: GenerateRequest):
-    """
-    Generate high-quality images with SDXL + optional enhancements
-    """
-    if not base_pipe:
-        raise HTTPException(status_code=503, detail="Models not loaded")
-    
-    try:
-        logger.info(f"📝 Generating image with prompt: {request.prompt[:50]}...")
-        
+_lcm_loaded = False
+_lcm_active = False
+_saved_scheduler = None  # DPM-Solver++, parked while LCM is active
+
+def _set_lcm(enabled: bool):
+    """Toggle the LCM LoRA + scheduler for the current request.
+
+    The LoRA weights download/load once; after that enabling is a cheap
+    adapter flip plus a scheduler swap, and disabling restores DPM-Solver++
+    so normal requests are unaffected. 6 steps at cfg 1.0-2.0 replaces a
+    full 20-step run."""
+    global _lcm_loaded, _lcm_active, _saved_scheduler
+    if enabled and not _lcm_loaded:
+        base_pipe.load_lora_weights("latent-consistency/lcm-lora-sdxl", adapter_name="lcm")
+        _lcm_loaded = True
+        logger.info("✅ LCM LoRA loaded")
+    if enabled == _lcm_active:
+        return
+    if enabled:
+        _saved_scheduler = base_pipe.scheduler
+        base_pipe.scheduler = LCMScheduler.from_config(base_pipe.scheduler.config)
+        base_pipe.set_adapters(["lcm"])
+    else:
+        base_pipe.scheduler = _saved_scheduler
+        base_pipe.disable_lora()
+    _lcm_active = enabled
+
+def run_generation(request: GenerateRequest) -> Image.Image:
+    """Shared generation path for the base64 and raw endpoints"""
+    logger.info(f"📝 Generating image with prompt: {request.prompt[:50]}...")
+
+    if _ort_backend:
+        return _run_generation_ort(request)
+
+    _set_lcm(bool(request.lcm_lora))
+    steps = request.steps
+    cfg_scale = request.cfg_scale
+    if request.lcm_lora:
+        # LCM converges in 4-8 steps and degrades at high guidance
+        steps = min(steps, 6)
+        cfg_scale = min(cfg_scale, 1.5)
+
+    # inference_mode: without it autograd tracks the whole UNet graph,
+    # ~15% extra VRAM plus bookkeeping per step
+    with torch.inference_mode():
         if request.use_hires_fix and refiner_pipe:
-            image = hires_fix(
+            image_t = hires_fix(
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt,
                 seed=request.seed,
                 width=request.width,
                 height=request.height,
-                steps=request.steps,
-                cfg_scale=request.cfg_scale,
+                steps=steps,
+                cfg_scale=cfg_scale,
             )
         else:
             # Simple generation without hires fix
-            generator = torch.manual_seed(request.seed)
-            image = base_pipe(
-                prompt=request.prompt,
-                negative_prompt=request.negative_prompt,
-                width=request.width,
-                height=request.height,
-                num_inference_steps=request.steps,
-                guidance_scale=request.cfg_scale,
-                generator=generator,
-            ).images[0]
-        
-        # Apply face restoration if requested
+            generator = get_generator(request.seed)
+            embeds, pooled = _encode_prompt(request.prompt)
+            neg_embeds, neg_pooled = _encode_prompt(request.negative_prompt)
+            try:
+                image_t = base_pipe(
+                    prompt_embeds=embeds,
+                    pooled_prompt_embeds=pooled,
+                    negative_prompt_embeds=neg_embeds,
+                    negative_pooled_prompt_embeds=neg_pooled,
+                    width=request.width,
+                    height=request.height,
+                    num_inference_steps=steps,
+                    guidance_scale=cfg_scale,
+                    generator=generator,
+                    output_type="pt",
+                ).images
+            finally:
+                put_generator(generator)
+
+        # Post-processing stays on the GPU tensor; PIL materializes once at
+        # the end instead of between every stage
         if request.use_face_restoration:
-            image = restore_faces_simple(image)
-        
+            image_t = restore_faces_simple(image_t)
+
+        # output_type="pt" already denormalized to [0, 1] inside the pipeline;
+        # postprocess here is only for the tensor->PIL conversion
+        return base_pipe.image_processor.postprocess(
+            image_t, output_type="pil",
+            do_denormalize=[False] * image_t.shape[0],
+        )[0]
+
+# ---- Request batching ----
+# SDXL kernels are underutilized at batch=1; concurrent requests that agree
+# on resolution/steps are collected for a short window and denoised together
+MAX_BATCH = int(os.environ.get("MAX_BATCH", "4"))
+BATCH_WINDOW_S = 0.02
+
+_batch_queue = None  # created on startup, inside the event loop
+
+def _run_batch(reqs):
+    """Run a group of compatible requests; returns one image per request"""
+    # hires fix and face restoration stay single-request paths; the batched
+    # branch below assumes torch (generator pool, _set_lcm), so ORT does too
+    if _ort_backend or len(reqs) == 1 or (reqs[0].use_hires_fix and refiner_pipe) or any(r.use_face_restoration for r in reqs):
+        return [run_generation(r) for r in reqs]
+
+    r0 = reqs[0]
+    # Batches are grouped by lcm_lora, so one toggle covers the whole group
+    _set_lcm(bool(r0.lcm_lora))
+    steps = r0.steps
+    cfg_scale = r0.cfg_scale
+    if r0.lcm_lora:
+        steps = min(steps, 6)
+        cfg_scale = min(cfg_scale, 1.5)
+    with torch.inference_mode():
+        generators = [get_generator(r.seed) for r in reqs]
+        try:
+            return base_pipe(
+                prompt=[r.prompt for r in reqs],
+                negative_prompt=[r.negative_prompt for r in reqs],
+                width=r0.width,
+                height=r0.height,
+                num_inference_steps=steps,
+                guidance_scale=cfg_scale,
+                generator=generators,
+            ).images
+        finally:
+            for g in generators:
+                put_generator(g)
+
+async def _batch_worker():
+    """Drain the queue, group compatible requests, fan results back out"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _batch_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_S
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        groups = {}
+        for req, fut in batch:
+            key = (req.width, req.height, req.steps, req.cfg_scale,
+                   req.use_hires_fix, req.use_face_restoration, req.lcm_lora)
+            groups.setdefault(key, []).append((req, fut))
+
+        for items in groups.values():
+            try:
+                images = await asyncio.to_thread(_run_batch, [req for req, _ in items])
+                for (_, fut), image in zip(items, images):
+                    if not fut.done():
+                        fut.set_result(image)
+            except Exception as e:
+                for _, fut in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+async def generate_queued(request: GenerateRequest) -> Image.Image:
+    fut = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((request, fut))
+    return await fut
+
+@app.post("/generate")
+async def generate(request: GenerateRequest):
+    """
+    Generate high-quality images with SDXL + optional enhancements.
+
+    Deprecated in favor of /generate/raw: base64-in-JSON inflates the payload
+    by 33% and doubles peak memory; kept for existing clients.
+    """
+    if not base_pipe:
+        raise HTTPException(status_code=503, detail="Models not loaded")
+
+    try:
+        image = await generate_queued(request)
+
         # Convert to base64
-        image_b64 = image_to_base64(image)
-        
+        image_b64 = image_to_base64(image, fmt=request.format)
+
         logger.info("✅ Image generated successfully")
-        
+        _save_inductor_cache()
+
         return {
             "success": True,
             "image": image_b64,
             "seed": request.seed,
             "model": "SDXL",
         }
-        
+
+    except Exception as e:
+        logger.error(f"❌ Error generating image: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/generate/raw")
+async def generate_raw(request: GenerateRequest):
+    """Raw image bytes: no base64 inflation, no giant str, metadata in headers"""
+    if not base_pipe:
+        raise HTTPException(status_code=503, detail="Models not loaded")
+
+    try:
+        image = await generate_queued(request)
+
+        buffer = BytesIO()
+        if request.format.lower() == "webp":
+            image.save(buffer, format="WEBP", lossless=True, method=0, quality=95)
+            media_type = "image/webp"
+        else:
+            image.save(buffer, format="PNG", compress_level=1, optimize=False)
+            media_type = "image/png"
+
+        logger.info("✅ Image generated successfully")
+        _save_inductor_cache()
+
+        return Response(
+            content=buffer.getvalue(),
+            media_type=media_type,
+            headers={
+                "X-Seed": str(request.seed),
+                "X-Resolution": f"{image.width}x{image.height}",
+            },
+        )
+
     except Exception as e:
         logger.error(f"❌ Error generating image: {e}")
         raise HTTPException(status_code=500, detail=str(e))
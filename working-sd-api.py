@@ -5,13 +5,27 @@ Compatible with torch 2.4.0 and diffusers 0.30.0
 """
 import os
 import io
-import base64
+try:
+    import pybase64 as base64  # SIMD base64; drop-in for the calls we use
+except ImportError:
+    import base64
 import logging
+import threading
+import anyio.to_thread
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+
+# Lazy CUDA module loading: faster import, less VRAM held by unused kernels
+os.environ.setdefault("CUDA_MODULE_LOADING", "LAZY")
 import torch
 
+# TF32 + cudnn autotune: big matmul/conv win on Ampere+, and the 512x512
+# shapes here are fixed so the autotune cost is paid once
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
+torch.backends.cudnn.benchmark = True
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,6 +44,10 @@ app.add_middleware(
 # Global variables
 pipe = None
 model_loaded = False
+# Diffusers pipelines mutate scheduler state per call, so generations must
+# not overlap; the lock serializes pipe() while /health and / stay responsive
+# on other threadpool threads.
+generate_lock = threading.Lock()
 
 class GenerateRequest(BaseModel):
     prompt: str
@@ -40,6 +58,10 @@ class GenerateRequest(BaseModel):
 @app.on_event("startup")
 async def load_model():
     global pipe, model_loaded
+    # The default anyio limiter (40 tokens) is shared by every sync handler
+    # in the process; raise it so queued /generate calls can't starve
+    # /health and / admission
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 64
     try:
         logger.info("Loading Stable Diffusion model...")
         from diffusers import StableDiffusionPipeline
@@ -60,9 +82,12 @@ async def load_model():
         else:
             logger.warning("CUDA not available, using CPU (will be slow)")
         
-        # Enable optimizations
-        pipe.enable_attention_slicing()
-        
+        # Flash SDPA attention instead of attention slicing: slicing trades
+        # speed for memory by chunking attention, which a GPU that fits SD1.5
+        # does not need (and it disables the fused SDPA path)
+        from diffusers.models.attention_processor import AttnProcessor2_0
+        pipe.unet.set_attn_processor(AttnProcessor2_0())
+
         model_loaded = True
         logger.info("✅ Model loaded successfully!")
         
@@ -71,7 +96,7 @@ async def load_model():
         model_loaded = False
 
 @app.get("/")
-async def root():
+def root():
     return {
         "message": "Stable Diffusion API",
         "status": "running",
@@ -81,15 +106,18 @@ async def root():
     }
 
 @app.get("/health")
-async def health():
+def health():
     return {
         "status": "healthy",
         "model_loaded": model_loaded,
         "cuda_available": torch.cuda.is_available()
     }
 
+# Plain `def` so FastAPI runs this on its threadpool: the pipe() call blocks
+# for seconds, and an async handler would freeze the event loop (and /health)
+# for the whole generation.
 @app.post("/generate")
-async def generate_image(request: GenerateRequest):
+def generate_image(request: GenerateRequest):
     if not model_loaded:
         raise HTTPException(status_code=503, detail="Model not loaded yet, please wait...")
     
@@ -97,7 +125,7 @@ async def generate_image(request: GenerateRequest):
         logger.info(f"Generating image for prompt: {request.prompt}")
         
         # Generate image
-        with torch.inference_mode():
+        with generate_lock, torch.inference_mode():
             result = pipe(
                 prompt=request.prompt,
                 negative_prompt=request.negative_prompt,